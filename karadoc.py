@@ -1,19 +1,72 @@
+import os
+import sys
 import threading
 import time
+
+START = time.perf_counter()
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 import webview
-from werkzeug.serving import make_server
+from werkzeug.serving import BaseWSGIServer, make_server
 from dotenv import load_dotenv
 
 # Importer l'application Flask
-from karapp.app import app
+from karapp.app import app, DATA_PATH, SYNC_WORKERS, PODCAST_REFRESH_INTERVAL, thumbs, start_download, init_db
+from karapp.watcher import LibraryWatcher
+from karapp.podcasts import PodcastRefresher
+from karapp.wifi import get_wifi_state
 
 load_dotenv()
 
+HOST = '127.0.0.1'
+PORT = 5000
+SERVER_URL = f'http://{HOST}:{PORT}'
+# requêtes traitées en parallèle par le serveur (0 = un thread par requête)
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 16))
+# délai maximal d'attente du serveur au démarrage, en secondes
+READY_TIMEOUT = float(os.getenv('READY_TIMEOUT', 15))
+# délai maximal d'attente de la première page avant de vérifier la base
+FIRST_PAINT_TIMEOUT = 10
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Serveur werkzeug dont les requêtes sont traitées par un pool de threads
+
+    Une synchronisation ou un scan Bluetooth en cours ne bloque plus les autres
+    requêtes (suivi de progression, lecture audio), et le nombre de threads
+    reste borné.
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, workers):
+        super().__init__(host, port, app)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
 class ServerThread(threading.Thread):
     """Thread pour exécuter le serveur Flask en arrière-plan"""
-    def __init__(self, app):
+    def __init__(self, app, workers=SERVER_WORKERS):
         threading.Thread.__init__(self)
-        self.server = make_server('127.0.0.1', 5000, app)
+        if workers > 0:
+            self.server = PooledWSGIServer(HOST, PORT, app, workers)
+        else:
+            self.server = make_server(HOST, PORT, app, threaded=True)
         self.ctx = app.app_context()
         self.ctx.push()
 
@@ -24,6 +77,32 @@ class ServerThread(threading.Thread):
     def shutdown(self):
         print('Arrêt du serveur Flask...')
         self.server.shutdown()
+        self.server.server_close()
+
+
+def wait_until_ready(url, timeout=READY_TIMEOUT):
+    """
+    Attend que la sonde de disponibilité du serveur réponde
+
+    Args:
+        url: Adresse de la sonde
+        timeout: Délai maximal d'attente en secondes
+
+    Returns:
+        True si le serveur est prêt, False après le délai
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+    return False
 
 
 class NavigationAPI:
@@ -45,7 +124,7 @@ class NavigationAPI:
 
     def go_home(self):
         """Retourner à l'accueil"""
-        self._window.evaluate_js('window.location.href = "http://127.0.0.1:5000"')
+        self._window.evaluate_js(f'window.location.href = "{SERVER_URL}"')
 
     def set_window(self, window):
         self._window = window
@@ -151,14 +230,55 @@ def on_loaded(window):
     inject_navigation_bar(window)
 
 
+def start_services(first_paint, services):
+    """
+    Vérifie le schéma de la base puis démarre les tâches de fond, une fois la
+    première page affichée
+
+    Args:
+        first_paint: threading.Event levé au chargement de la première page
+        services: Liste complétée avec les threads démarrés
+    """
+    first_paint.wait(FIRST_PAINT_TIMEOUT)
+    init_db()
+
+    # État WiFi en cache pour les pages de paramètres
+    wifi_state = get_wifi_state()
+    wifi_state.start()
+    services.append(wifi_state)
+
+    # Surveiller la bibliothèque (optionnel)
+    if os.getenv('WATCH_LIBRARY') == '1':
+        watcher = LibraryWatcher(app, DATA_PATH, thumbs, workers=SYNC_WORKERS)
+        watcher.start()
+        services.append(watcher)
+
+    # Actualiser les podcasts abonnés
+    if PODCAST_REFRESH_INTERVAL > 0:
+        refresher = PodcastRefresher(app, start_download, interval=PODCAST_REFRESH_INTERVAL)
+        refresher.start()
+        services.append(refresher)
+
+
 def main():
+    if '--startup-report' in sys.argv:
+        from karapp.startup import report
+        report()
+        return
+
     # Démarrer le serveur Flask dans un thread séparé
     server = ServerThread(app)
     server.daemon = True
     server.start()
 
+    # Base et tâches de fond après l'affichage de la première page
+    first_paint = threading.Event()
+    services = []
+    threading.Thread(target=start_services, args=(first_paint, services), daemon=True).start()
+
     # Attendre que le serveur soit prêt
-    time.sleep(1)
+    if not wait_until_ready(SERVER_URL + '/healthz'):
+        print(f"Le serveur ne répond pas après {READY_TIMEOUT} s, ouverture de la fenêtre quand même")
 
     # Créer l'API de navigation (sans fenêtre pour l'instant)
     api = NavigationAPI()
@@ -166,7 +286,7 @@ def main():
     # Créer et afficher la fenêtre webview avec l'API
     window = webview.create_window(
         title='Karadoc',
-        url='http://127.0.0.1:5000',
+        url=SERVER_URL,
         width=800,
         height=600,
         resizable=True,
@@ -181,10 +301,19 @@ def main():
     # Injecter la barre de navigation après le chargement
     window.events.loaded += lambda: on_loaded(window)
 
+    def on_first_paint():
+        if not first_paint.is_set():
+            first_paint.set()
+            print(f'Première page affichée après {time.perf_counter() - START:.2f} s')
+
+    window.events.loaded += on_first_paint
+
     # Démarrer webview (bloquant jusqu'à fermeture de la fenêtre)
     webview.start(debug=False)
 
     # Arrêter le serveur Flask quand la fenêtre est fermée
+    for service in services:
+        service.stop()
     server.shutdown()
 
 
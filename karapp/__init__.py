@@ -1 +0,0 @@
-from karapp import app
\ No newline at end of file
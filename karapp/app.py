@@ -1,26 +1,51 @@
+import hashlib
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-import requests
-from threading import Thread
-import uuid
+from threading import Thread, Event, Lock, BoundedSemaphore
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from flask import Flask, render_template, redirect, url_for, request, send_from_directory, jsonify
+from flask import Flask, Response, render_template, redirect, url_for, request, send_file, jsonify, abort
+from sqlalchemy import select, text
+from sqlalchemy.orm import load_only
 from werkzeug.utils import secure_filename
 
 from karapp.wifi import connection_bp, get_current_wifi
 from karapp.bluetooth import  bluetooth_bp, get_connected_bluetooth_devices
 from karapp.models import db, FileModel
-from karapp.tools.music import get_metadata
-from karapp.tools.photo import make_artwork_base64
+from karapp.migrations import upgrade_db
+from karapp.library import SYNC_LOCK, SyncCancelled, sync_library
+from karapp.tasks import tasks, event_stream
+from karapp.tools.thumbnails import ThumbnailStore
+from karapp.tools.photo import THUMB_SIZES
+from karapp.tools.download import download_file
+from karapp.tools.media import detect_mimetype
 from karapp.tools import rss
 
 load_dotenv()
 
 DATA_PATH = os.getenv('DATA_PATH')
 DB_PATH = os.path.join(os.getenv('DB_PATH'), 'karapp.db')
-
-tasks_progress = {}
+THUMB_PATH = os.getenv('THUMB_PATH', os.path.join(os.getenv('DB_PATH'), 'thumbs'))
+# format des nouvelles miniatures : JPEG ou WEBP
+THUMB_FORMAT = os.getenv('THUMB_FORMAT', 'JPEG').upper()
+# nombre de processus d'extraction des métadonnées (1 = mode série)
+SYNC_WORKERS = int(os.getenv('SYNC_WORKERS', os.cpu_count() or 1))
+# téléchargements simultanés d'épisodes, par tâche et pour toute l'application
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', 3))
+MAX_DOWNLOADS = int(os.getenv('MAX_DOWNLOADS', 4))
+# intervalle d'actualisation des podcasts en secondes (0 = désactivé)
+PODCAST_REFRESH_INTERVAL = int(os.getenv('PODCAST_REFRESH_INTERVAL', 6 * 3600))
+# nombre de cartes par page de /categorie/<nom>
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 60))
+# durée en secondes pendant laquelle le navigateur réutilise un média sans revalidation
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', 24 * 3600))
+
+# synchronisation de la bibliothèque en cours : {'task_id': ..., 'cancel': Event}
+sync_task = None
+sync_task_lock = Lock()
+download_slots = BoundedSemaphore(MAX_DOWNLOADS)
+thumbs = ThumbnailStore(THUMB_PATH, THUMB_FORMAT)
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///'+DB_PATH
@@ -30,10 +55,37 @@ app.register_blueprint(bluetooth_bp)
 
 db.init_app(app)
 
-# if not os.path.exists(DB_PATH):
-with app.app_context():
-    # db.drop_all()
-    db.create_all()
+# schéma vérifié après l'affichage de la première page, ou à la première requête
+# qui utilise la base
+db_ready = Event()
+db_ready_lock = Lock()
+# routes servies sans attendre la base
+NO_DB_ENDPOINTS = {'index', 'static', 'healthz'}
+
+
+def init_db():
+    """Crée ou met à jour le schéma de la base, une seule fois"""
+    with db_ready_lock:
+        if db_ready.is_set():
+            return
+        with app.app_context():
+            upgrade_db(thumbs)
+        db_ready.set()
+
+
+@app.before_request
+def wait_for_db():
+    if request.blueprint is None and request.endpoint not in NO_DB_ENDPOINTS:
+        init_db()
+
+@app.get('/healthz')
+def healthz():
+    """Sonde de disponibilité : le serveur répond et la base est accessible"""
+    try:
+        db.session.execute(text('SELECT 1'))
+    except Exception as e:
+        return jsonify(status='error', error=str(e)), 503
+    return jsonify(status='ok')
 
 @app.route('/')
 def index():
@@ -47,71 +99,118 @@ def parametres():
 
 @app.route('/sync_db', endpoint='db_sync')
 def synd_db():
-    for each in ['photo', 'musique']:
-        p = Path(DATA_PATH)/each
-        # ajouter les nouveaux fichiers
-        for f in p.rglob('*'):
-            model = FileModel.query.filter_by(path=str(f)).all()
-            if len(model)==0:
-                artwork = None
-                name = None
-                artist = None
-                album = None
-                if f.is_file():
-                    ftype = 'file'
-                    if each == 'musique':
-                        meta = get_metadata(str(f))
-                        artwork = meta['artwork']
-                        artist = meta['artist']
-                        name = meta['title']
-                        album = meta['album']
-                    elif each == 'photo':
-                        name = f.name.split('.')[0]
-                        artwork = make_artwork_base64(str(f))
-                else:
-                    ftype = 'dir'
-                    name = f.name
-
-                fmodel = FileModel(
-                    type=ftype,
-                    category = each,
-                    path = str(f),
-                    name = name,
-                    artwork = artwork,
-                    artist = artist,
-                    album=album
-
-                )
-                parent = FileModel.query.filter_by(path=str(f.parent)).first()
-                if parent is not None:
-                    fmodel.parent = parent.id
-                db.session.add(fmodel)
-
-        # retirer ceux qui n'existent plus
-        all_files = FileModel.query.all()
-        for f in all_files:
-            if not os.path.exists(f.path):
-                FileModel.query.filter(FileModel.id == f.id).delete()
-        db.session.commit()
-    return redirect(url_for('parametres'))
+    global sync_task
+    full = request.args.get('full') == '1'
+    # une seule synchronisation à la fois : rejoindre celle en cours
+    with sync_task_lock:
+        if sync_task is None:
+            cancel = Event()
+            task_id = tasks.create('sync', scanned=0, total=0, extracted=0, committed=0)
+            sync_task = {'task_id': task_id, 'cancel': cancel}
+            thread = Thread(target=sync_worker, args=(task_id, full, cancel), daemon=True)
+            thread.start()
+        else:
+            task_id = sync_task['task_id']
+
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return jsonify({"task_id": task_id})
+    return render_template('sync.html', task_id=task_id)
+
+@app.post('/sync_db/cancel')
+def cancel_sync():
+    with sync_task_lock:
+        running = sync_task is not None
+        if running:
+            sync_task['cancel'].set()
+    return jsonify({"cancelled": running})
+
+def sync_worker(task_id, full, cancel):
+    """Synchronisation de la bibliothèque exécutée dans un thread séparé"""
+    global sync_task
+
+    def progress(stats):
+        if stats['total']:
+            # le parcours compte pour 10%, l'extraction pour le reste
+            percent = min(99, 10 + int(stats['extracted'] * 89 / stats['total']))
+        else:
+            percent = 10 if stats['scanned'] else 0
+        tasks.update(task_id, progress=percent, scanned=stats['scanned'], total=stats['total'],
+                     extracted=stats['extracted'], committed=stats['committed'])
+
+    try:
+        with app.app_context(), SYNC_LOCK:
+            stats = sync_library(DATA_PATH, thumbs, full=full, workers=SYNC_WORKERS,
+                                 progress=progress, cancel=cancel)
+        print('Synchronisation de la bibliothèque: %s' % stats)
+        tasks.finish(task_id, committed=stats['committed'])
+    except SyncCancelled:
+        tasks.finish(task_id, 'cancelled')
+    except Exception as e:
+        print(f"Erreur lors de la synchronisation de la bibliothèque: {e}")
+        tasks.finish(task_id, 'error', message=str(e))
+    finally:
+        with sync_task_lock:
+            sync_task = None
 
 @app.route('/categorie/<nom>')
 def categorie(nom):
-    parent_id = request.args.get('parent_id')
-    models = FileModel.query.filter_by(category=nom, parent=parent_id).all()
-    return render_template('files.html', cat=nom, items=models)
-
-@app.route("/categorie/<path:filename>")
-def serve_file(filename):
-    ftype = request.args.get('type')
-    if not filename.startswith('/'):
-        filename = '/' + filename
-    directory = os.path.dirname(filename)
-    file_name = os.path.basename(filename)
-    if ftype == 'music':
-        return send_from_directory(directory, file_name, mimetype='audio/mpeg')
-    else:
-        return send_from_directory(directory, file_name, mimetype='image/jpeg')
+    parent_id = request.args.get('parent_id', type=int)
+    after = request.args.get('after', 0, type=int)
+    # pagination par clé (id) et seulement les colonnes affichées par la grille
+    models = (FileModel.query
+              .options(load_only(FileModel.type, FileModel.path, FileModel.name,
+                                 FileModel.artist, FileModel.artwork_hash))
+              .filter_by(category=nom, parent=parent_id)
+              .filter(FileModel.id > after)
+              .order_by(FileModel.id)
+              .limit(PAGE_SIZE + 1)
+              .all())
+    next_after = models[PAGE_SIZE - 1].id if len(models) > PAGE_SIZE else None
+    models = models[:PAGE_SIZE]
+
+    template = 'files.html'
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        template = 'files_page.html'
+    podcast = None
+    if nom == 'podcast' and parent_id:
+        podcast = db.session.get(FileModel, parent_id)
+    return render_template(template, cat=nom, items=models, parent_id=parent_id,
+                           next_after=next_after, podcast=podcast)
+
+@app.post('/podcast/<int:podcast_id>/auto_download')
+def toggle_auto_download(podcast_id):
+    podcast = db.get_or_404(FileModel, podcast_id)
+    podcast.auto_download = not podcast.auto_download
+    db.session.commit()
+    return redirect(url_for('categorie', nom='podcast', parent_id=podcast_id))
+
+@app.get('/media/<int:file_id>')
+def media(file_id):
+    model = db.get_or_404(FileModel, file_id)
+    if model.type != 'file' or not os.path.isfile(model.path):
+        abort(404)
+    if model.mimetype is None:
+        # fichiers indexés avant l'enregistrement du type MIME
+        model.mimetype = detect_mimetype(model.path)
+        db.session.commit()
+    # conditional : requêtes Range (déplacement dans un podcast), ETag et If-Modified-Since
+    response = send_file(model.path, mimetype=model.mimetype, conditional=True, etag=True,
+                         max_age=MEDIA_MAX_AGE)
+    response.cache_control.public = True
+    return response
+
+@app.get('/thumb/<digest>')
+def thumb(digest):
+    variant = request.args.get('variant')
+    path = thumbs.find(digest, variant)
+    if path is None:
+        abort(404)
+    # le contenu d'une miniature ne change jamais pour un hash donné
+    response = send_file(path, mimetype=thumbs.mimetype(path), etag=path.stem,
+                         max_age=365 * 24 * 3600)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/add_podcast', methods=['GET', 'POST'])
 def add_podcast():
@@ -127,30 +226,49 @@ def add_podcast():
 def podcast_search():
     podcast_name = request.form.get("podcast_name")
     search_tool_name = request.form.get("searchtool")
-    tool = rss.get_tool_by_name(search_tool_name)
-    resultats = tool.search(podcast_name)
-    return render_template("add_rss.html", resultats=resultats)
+    # sans outil choisi, tous les outils sont interrogés en parallèle
+    names = [search_tool_name] if search_tool_name else None
+    resultats = rss.search(podcast_name, names)
+    return render_template("add_rss.html", resultats=resultats, searchtools=rss.list_tools())
 
 @app.post('/download_podcast')
 def download_podcast():
     selected = request.form.getlist("selected")
     podcast_url = request.form['playlist_url']
-
-    task_id = str(uuid.uuid4())
-    tasks_progress[task_id] = 0
-
-    # Lancer le téléchargement dans un thread
-    thread = Thread(target=download_worker, args=(task_id, selected, podcast_url), daemon=True)
-    thread.start()
+    task_id = start_download(selected, podcast_url)
 
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         return jsonify({"task_id": task_id})
     # Retourner la page avec la barre de progression
     return render_template("progress.html", task_id=task_id)
 
+def start_download(selected, podcast_url):
+    """
+    Lance le téléchargement d'épisodes dans un thread
+
+    Args:
+        selected: Titres des épisodes à télécharger
+        podcast_url: Adresse du flux RSS
+
+    Returns:
+        Identifiant de la tâche (voir /tasks/<task_id>/events)
+    """
+    task_id = tasks.create('download', podcast=podcast_url)
+
+    thread = Thread(target=download_worker, args=(task_id, selected, podcast_url), daemon=True)
+    thread.start()
+    return task_id
+
 def download_worker(task_id, selected, podcast_url):
+    """Téléchargement d'épisodes exécuté dans un thread séparé"""
+    try:
+        download_episodes(task_id, selected, podcast_url)
+    except Exception as e:
+        print(f"Erreur lors du téléchargement des épisodes de {podcast_url}: {e}")
+        tasks.finish(task_id, 'error', message=str(e))
+
+def download_episodes(task_id, selected, podcast_url):
     """
-    Worker exécuté dans un thread séparé.
     IMPORTANT : on doit recréer un app_context pour pouvoir utiliser `db` et d'autres
     objets Flask/SQAlchemy en toute sécurité.
     """
@@ -165,13 +283,13 @@ def download_worker(task_id, selected, podcast_url):
             path.mkdir(parents=True, exist_ok=True)
 
             # artwork et model de dossier
-            artwork = make_artwork_base64(infos.get('image'), size=150)
+            artwork_hash = thumbs.put_artwork(infos.get('image'), size=THUMB_SIZES['podcast'])
             dir_model = FileModel(
                 type='dir',
                 category='podcast',
                 path=str(path),
                 name=infos['titre'],
-                artwork=artwork,
+                artwork_hash=artwork_hash,
                 url=podcast_url,
                 description=infos.get('description')
             )
@@ -181,51 +299,102 @@ def download_worker(task_id, selected, podcast_url):
             print('%s existe' %infos['titre'])
 
         episodes = rss.get_episodes_list(podcast_url) or []
-        # total d'épisodes sélectionnés (éviter division par 0)
-        total = sum(1 for ep in episodes if ep['titre'] in selected)
-        if total == 0:
-            tasks_progress[task_id] = 100
-            return
-
-        done = 0
+        if episodes and dir_model.last_seen_guid is None:
+            # abonnement : les épisodes déjà publiés ne seront pas signalés comme nouveaux
+            dir_model.last_seen_guid = episodes[0]['guid']
+            db.session.commit()
+        # chemins déjà pris dans le dossier : deux épisodes ne doivent jamais
+        # écrire dans le même fichier (titres identiques, rediffusions...)
+        used_paths = set(db.session.execute(
+            select(FileModel.path).where(FileModel.parent == dir_model.id)).scalars())
+        todo = []
         for each in episodes:
-            epModel = FileModel.query.filter_by(parent=dir_model.id, name=each['titre']).first()
-            if each['titre'] not in selected or epModel is not None:
-                if epModel is not None:
-                    print('%s déjà en mémoire' %each['titre'])
+            if each['titre'] not in selected:
+                continue
+            if FileModel.query.filter_by(parent=dir_model.id, name=each['titre']).first() is not None:
+                print('%s déjà en mémoire' %each['titre'])
                 continue
-
             epath = path / secure_filename(f"{each['titre']}.mp3")
-            ep_url = each.get('audio')
-            response = requests.get(ep_url, timeout=30)
-            response.raise_for_status()
+            if str(epath) in used_paths:
+                suffix = hashlib.sha1(str(each.get('guid')).encode()).hexdigest()[:8]
+                epath = path / secure_filename(f"{each['titre']}-{suffix}.mp3")
+            if str(epath) in used_paths:
+                print('%s apparaît plusieurs fois dans le flux' %each['titre'])
+                continue
+            used_paths.add(str(epath))
+            todo.append((each, epath))
 
-            with open(epath, "wb") as f:
-                f.write(response.content)
+        # total d'épisodes à télécharger (éviter division par 0)
+        total = len(todo)
+        if total == 0:
+            tasks.finish(task_id)
+            return
 
-            epModel = FileModel(
-                type='file',
-                category='podcast',
-                path=str(epath),
-                name=each['titre'],
-                artwork=make_artwork_base64(each.get('image'), size=150),
-                url=ep_url,
-                description=each.get('description'),
-                parent=dir_model.id
-            )
-            db.session.add(epModel)
-            db.session.commit()
-            # Mettre à jour la progression
-            done += 1
-            # calcul safe (entier)
-            tasks_progress[task_id] = int(done * 100 / total)
+        # progression de chaque épisode : chemin -> (octets reçus, taille ou None)
+        received = {}
+        finished = set()
+        lock = Lock()
+
+        def report(key, done_bytes=None, size=None):
+            with lock:
+                if done_bytes is None:
+                    finished.add(key)
+                else:
+                    received[key] = (done_bytes, size)
+                received_bytes = sum(r for r, _ in received.values())
+                fraction = len(finished) + sum(r / s for t, (r, s) in received.items()
+                                               if s and t not in finished)
+            tasks.update(task_id, bytes=received_bytes, progress=min(99, int(fraction * 100 / total)))
+
+        def fetch(each, epath):
+            """Téléchargement d'un épisode, exécuté par le pool"""
+            # limite globale du nombre de téléchargements simultanés
+            with download_slots:
+                download_file(each.get('audio'), epath,
+                              progress=lambda r, size: report(epath, r, size))
+            return thumbs.put_artwork(each.get('image'), size=THUMB_SIZES['podcast'])
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = {executor.submit(fetch, each, epath): (each, epath) for each, epath in todo}
+            # chaque épisode est enregistré dès la fin de son téléchargement
+            for future in as_completed(futures):
+                each, epath = futures[future]
+                try:
+                    artwork_hash = future.result()
+                    epModel = FileModel(
+                        type='file',
+                        category='podcast',
+                        path=str(epath),
+                        name=each['titre'],
+                        artwork_hash=artwork_hash,
+                        url=each.get('audio'),
+                        description=each.get('description'),
+                        guid=each.get('guid'),
+                        mimetype=detect_mimetype(epath),
+                        parent=dir_model.id
+                    )
+                    db.session.add(epModel)
+                    db.session.commit()
+                except Exception as e:
+                    # un épisode en échec n'interrompt pas les autres
+                    db.session.rollback()
+                    print(f"Erreur lors du téléchargement de {each['titre']}: {e}")
+                    tasks.add_error(task_id, f"{each['titre']}: {e}")
+                # un épisode terminé (ou en échec) compte pour 1
+                report(epath)
 
         # fin du travail
-        tasks_progress[task_id] = 100
+        tasks.finish(task_id)
 
 @app.get("/progress/<task_id>")
 def progress(task_id):
-    return jsonify({"progress": tasks_progress.get(task_id, 0)})
+    return jsonify(tasks.get(task_id) or {"progress": 0})
+
+@app.get('/tasks/<task_id>/events')
+def task_events(task_id):
+    """Progression d'une tâche envoyée au fil de l'eau (Server-Sent Events)"""
+    return Response(event_stream(tasks, task_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
 
 @app.template_filter('basename')
 def basename_filter(path):
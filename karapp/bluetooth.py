@@ -1,101 +1,121 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, Response, render_template, request, redirect, url_for, jsonify
+
+from karapp.tasks import tasks
 
 bluetooth_bp = Blueprint("bluetooth", __name__)
 _bt_manager = None
+_bt_manager_lock = threading.Lock()
+# BlueZ traite mal les appairages simultanés : une action à la fois
+_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bluetooth')
 
 @bluetooth_bp.route('/bluetooth_settings')
 def bluetooth_settings():
+    # appareils déjà connus tout de suite, la page suit ensuite /bluetooth/discover
     devices = bluetooth_scan_devices()
     connected_devices = get_connected_bluetooth_devices()
-    return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices)
 
+    # résultat de l'action lancée depuis cette page
+    job_id = request.args.get('job')
+    job = tasks.get(job_id) if job_id else None
+    pending = job_id if job and job['status'] == 'running' else None
+    success = job['message'] if job and job['status'] == 'done' else None
+    error = job['message'] if job and job['status'] == 'error' else None
+    return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices,
+                           pending=pending, success=success, error=error)
 
-@bluetooth_bp.route('/bluetooth/pair', methods=['POST'])
-def bluetooth_pair():
-    mac_address = request.form.get('mac')
-    if not mac_address:
-        return redirect(url_for('bluetooth_settings'))
 
-    success, message = bluetooth_pair_device(mac_address)
+@bluetooth_bp.route('/bluetooth/discover')
+def bluetooth_discover():
+    """Appareils trouvés par la découverte, envoyés au fil de l'eau (Server-Sent Events)"""
+    manager = _get_bt_manager()
+    session = manager.start_discovery() if manager is not None else None
 
-    devices = bluetooth_scan_devices()
-    connected_devices = get_connected_bluetooth_devices()
+    def stream():
+        seq, done = 0, session is None
+        while not done:
+            devices, seq, done = session.wait_events(seq)
+            for device in devices:
+                yield f'data: {json.dumps(device)}\n\n'
+            if not devices and not done:
+                # garder la connexion ouverte
+                yield ': ping\n\n'
+        yield 'event: done\ndata: {}\n\n'
 
-    if success:
-        return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices, success=message)
-    else:
-        return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices, error=message)
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 
-@bluetooth_bp.route('/bluetooth/connect', methods=['POST'])
-def bluetooth_connect():
-    mac_address = request.form.get('mac')
-    if not mac_address:
-        return redirect(url_for('bluetooth_settings'))
+@bluetooth_bp.route('/bluetooth/pair', methods=['POST'])
+def bluetooth_pair():
+    return _submit_job('pair', bluetooth_pair_device)
 
-    success, message = bluetooth_connect_device(mac_address)
 
-    devices = bluetooth_scan_devices()
-    connected_devices = get_connected_bluetooth_devices()
-
-    if success:
-        return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices, success=message)
-    else:
-        return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices, error=message)
+@bluetooth_bp.route('/bluetooth/connect', methods=['POST'])
+def bluetooth_connect():
+    return _submit_job('connect', bluetooth_connect_device)
 
 
 @bluetooth_bp.route('/bluetooth/disconnect', methods=['POST'])
 def bluetooth_disconnect():
-    mac_address = request.form.get('mac')
-    if not mac_address:
-        return redirect(url_for('bluetooth_settings'))
+    return _submit_job('disconnect', bluetooth_disconnect_device)
 
-    success, message = bluetooth_disconnect_device(mac_address)
 
-    devices = bluetooth_scan_devices()
-    connected_devices = get_connected_bluetooth_devices()
+@bluetooth_bp.route('/bluetooth/remove', methods=['POST'])
+def bluetooth_remove():
+    return _submit_job('remove', bluetooth_remove_device)
 
-    if success:
-        return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices, success=message)
-    else:
-        return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices, error=message)
 
+def _submit_job(action, func):
+    """
+    Lance une action Bluetooth en arrière-plan
 
-@bluetooth_bp.route('/bluetooth/remove', methods=['POST'])
-def bluetooth_remove():
+    La page est renvoyée tout de suite (depuis l'index des périphériques) et
+    suit l'action avec /tasks/<id>/events.
+    """
     mac_address = request.form.get('mac')
     if not mac_address:
-        return redirect(url_for('bluetooth_settings'))
+        return redirect(url_for('bluetooth.bluetooth_settings'))
 
-    success, message = bluetooth_remove_device(mac_address)
+    job_id = tasks.create('bluetooth', action=action, mac=mac_address)
+    _job_executor.submit(_run_job, job_id, func, mac_address)
+
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return jsonify({"job_id": job_id})
+    return redirect(url_for('bluetooth.bluetooth_settings', job=job_id))
 
-    devices = bluetooth_scan_devices()
-    connected_devices = get_connected_bluetooth_devices()
 
-    if success:
-        return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices, success=message)
-    else:
-        return render_template('bluetooth.html', devices=devices, connected_devices=connected_devices, error=message)
+def _run_job(job_id, func, mac_address):
+    """Action Bluetooth exécutée par _job_executor"""
+    try:
+        success, message = func(mac_address)
+    except Exception as e:
+        success, message = False, str(e)
+    tasks.finish(job_id, 'done' if success else 'error', message=message)
 
 
 def _get_bt_manager():
     """Récupère ou crée l'instance du gestionnaire Bluetooth"""
     global _bt_manager
-    if _bt_manager is None:
-        try:
-            from karapp.bluetooth_manager import BluetoothManager
-            _bt_manager = BluetoothManager()
-        except Exception as e:
-            print(f"Erreur lors de l'initialisation du gestionnaire Bluetooth: {e}")
-            _bt_manager = None
+    # une seule instance, même si plusieurs requêtes arrivent au démarrage
+    with _bt_manager_lock:
+        if _bt_manager is None:
+            try:
+                from karapp.bluetooth_manager import BluetoothManager
+                _bt_manager = BluetoothManager()
+            except Exception as e:
+                print(f"Erreur lors de l'initialisation du gestionnaire Bluetooth: {e}")
+                _bt_manager = None
     return _bt_manager
 
 def bluetooth_scan_devices():
-    """Scanne les périphériques Bluetooth disponibles"""
+    """Périphériques Bluetooth connus, sans attendre de scan"""
     manager = _get_bt_manager()
     if manager is None:
         return []
-    return manager.scan_devices(duration=5)
+    return manager.get_devices()
 
 def bluetooth_pair_device(mac_address):
     """Appaire un périphérique Bluetooth"""
@@ -1,8 +1,111 @@
 """
 Gestionnaire Bluetooth utilisant pydbus pour interagir avec BlueZ via D-Bus
+
+Les périphériques sont gardés dans un index en mémoire (adresse MAC -> chemin,
+propriétés, type), rempli une fois avec GetManagedObjects puis tenu à jour par
+les signaux D-Bus (InterfacesAdded, InterfacesRemoved, PropertiesChanged).
+Les signaux sont distribués par une boucle GLib qui tourne dans un thread dédié.
+Pour les tests, un bus factice est fourni par karapp.fake_dbus.
 """
-import time
-from pydbus import SystemBus
+import threading
+
+# durée d'une session de découverte en secondes
+DISCOVERY_DURATION = 10
+
+_main_loop_thread = None
+_main_loop_lock = threading.Lock()
+
+
+def start_main_loop():
+    """Démarre (une seule fois) la boucle GLib qui reçoit les signaux D-Bus"""
+    global _main_loop_thread
+    with _main_loop_lock:
+        if _main_loop_thread is None:
+            from gi.repository import GLib
+            _main_loop_thread = threading.Thread(target=GLib.MainLoop().run, daemon=True,
+                                                 name='dbus-signals')
+            _main_loop_thread.start()
+
+
+def device_type(device_props):
+    """Type d'un périphérique (audio, input ou unknown) d'après ses profils"""
+    uuids = device_props.get('UUIDs', [])
+    if any('110b' in uuid.lower() for uuid in uuids):  # A2DP
+        return 'audio'
+    if any('1124' in uuid.lower() for uuid in uuids):  # HID
+        return 'input'
+    return 'unknown'
+
+
+class DiscoverySession:
+    """
+    Recherche d'appareils Bluetooth en arrière-plan
+
+    Les appareils trouvés ou modifiés pendant la découverte (signalés par
+    l'index du BluetoothManager) sont ajoutés à une suite d'événements que la
+    page lit au fur et à mesure avec wait_events().
+    """
+
+    def __init__(self, manager, duration=DISCOVERY_DURATION):
+        """
+        Args:
+            manager: BluetoothManager
+            duration: Durée de la découverte en secondes
+        """
+        self.manager = manager
+        self.duration = duration
+        self.done = False
+        self._events = []
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+    def wait_events(self, seq, timeout=15):
+        """
+        Attend de nouveaux événements
+
+        Args:
+            seq: Nombre d'événements déjà lus
+            timeout: Délai maximal d'attente en secondes
+
+        Returns:
+            Tuple (nouveaux appareils, nouveau seq, session terminée)
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._events) > seq or self.done, timeout)
+            events = self._events[seq:]
+            return events, seq + len(events), self.done
+
+    def _on_device_changed(self, device_info):
+        with self._cond:
+            self._events.append(device_info)
+            self._cond.notify_all()
+
+    def _run(self):
+        manager = self.manager
+        manager.add_listener(self._on_device_changed)
+        try:
+            try:
+                manager.adapter.StartDiscovery()
+            except Exception as e:
+                # découverte déjà lancée par un autre client : les signaux arrivent quand même
+                print(f"Démarrage de la découverte Bluetooth: {e}")
+            self._stop_event.wait(self.duration)
+        finally:
+            try:
+                manager.adapter.StopDiscovery()
+            except Exception:
+                pass
+            manager.remove_listener(self._on_device_changed)
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
 
 
 class BluetoothManager:
@@ -11,102 +114,215 @@ class BluetoothManager:
     BLUEZ_SERVICE = 'org.bluez'
     ADAPTER_INTERFACE = 'org.bluez.Adapter1'
     DEVICE_INTERFACE = 'org.bluez.Device1'
+    OBJECT_MANAGER_INTERFACE = 'org.freedesktop.DBus.ObjectManager'
+    PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
 
-    def __init__(self):
-        """Initialise le gestionnaire Bluetooth"""
-        self.bus = SystemBus()
-        self.adapter_path = self._get_adapter_path()
+    def __init__(self, bus=None):
+        """
+        Initialise le gestionnaire Bluetooth
+
+        Args:
+            bus: Bus D-Bus (pydbus.SystemBus par défaut, karapp.fake_dbus.FakeBus pour les tests)
+        """
+        if bus is None:
+            from pydbus import SystemBus
+            bus = SystemBus()
+            start_main_loop()
+        self.bus = bus
+        self.adapter_path = None
         self.adapter = None
+        self._lock = threading.RLock()
+        self._devices = {}  # adresse MAC -> {'path', 'props', 'type'}
+        self._paths = {}  # chemin D-Bus -> adresse MAC
+        self._proxies = {}  # chemin D-Bus -> proxy du périphérique
+        self._listeners = []
+        self._discovery = None
+        self._discovery_lock = threading.Lock()
+
+        self._subscribe()
+        self._seed()
         if self.adapter_path:
             self.adapter = self.bus.get(self.BLUEZ_SERVICE, self.adapter_path)
 
-    def _get_adapter_path(self):
-        """Récupère le chemin D-Bus du premier adaptateur Bluetooth"""
+    def _subscribe(self):
+        """Abonnement aux signaux de BlueZ, avant la lecture initiale pour ne rien manquer"""
         try:
-            manager = self.bus.get(self.BLUEZ_SERVICE, '/')
-            managed_objects = manager.GetManagedObjects()
-
-            for path, interfaces in managed_objects.items():
-                if self.ADAPTER_INTERFACE in interfaces:
-                    return path
-            return None
+            self.bus.subscribe(sender=self.BLUEZ_SERVICE, iface=self.OBJECT_MANAGER_INTERFACE,
+                               signal='InterfacesAdded', signal_fired=self._on_interfaces_added)
+            self.bus.subscribe(sender=self.BLUEZ_SERVICE, iface=self.OBJECT_MANAGER_INTERFACE,
+                               signal='InterfacesRemoved', signal_fired=self._on_interfaces_removed)
+            self.bus.subscribe(sender=self.BLUEZ_SERVICE, iface=self.PROPERTIES_INTERFACE,
+                               signal='PropertiesChanged', signal_fired=self._on_properties_changed)
         except Exception as e:
-            print(f"Erreur lors de la récupération de l'adaptateur: {e}")
-            return None
+            print(f"Erreur lors de l'abonnement aux signaux Bluetooth: {e}")
 
-    def _get_device_objects(self):
-        """Récupère tous les objets device de BlueZ"""
+    def _seed(self):
+        """Remplit l'index avec les objets connus de BlueZ (un seul GetManagedObjects)"""
         try:
-            manager = self.bus.get(self.BLUEZ_SERVICE, '/')
-            return manager.GetManagedObjects()
+            managed_objects = self.bus.get(self.BLUEZ_SERVICE, '/').GetManagedObjects()
         except Exception as e:
-            print(f"Erreur lors de la récupération des devices: {e}")
-            return {}
+            print(f"Erreur lors de la récupération de l'adaptateur: {e}")
+            return
+
+        for path, interfaces in managed_objects.items():
+            if self.ADAPTER_INTERFACE in interfaces:
+                self.adapter_path = path
+                break
+        for path, interfaces in managed_objects.items():
+            if self.DEVICE_INTERFACE in interfaces:
+                self._index_device(path, interfaces[self.DEVICE_INTERFACE])
+
+    # --- index des périphériques ---
+
+    def _index_device(self, path, device_props):
+        """Ajoute ou remplace un périphérique dans l'index"""
+        # Filtrer les devices qui appartiennent à notre adaptateur
+        if not self.adapter_path or not path.startswith(self.adapter_path):
+            return None
+        props = dict(device_props)
+        mac = props.get('Address', '').upper()
+        if not mac:
+            return None
+        with self._lock:
+            self._devices[mac] = {'path': path, 'props': props, 'type': device_type(props)}
+            self._paths[path] = mac
+        return mac
+
+    def _on_interfaces_added(self, sender, obj, iface, signal, params):
+        path, interfaces = params
+        if self.DEVICE_INTERFACE in interfaces:
+            mac = self._index_device(path, interfaces[self.DEVICE_INTERFACE])
+            if mac:
+                self._notify(mac)
+
+    def _on_interfaces_removed(self, sender, obj, iface, signal, params):
+        path, interfaces = params
+        if self.DEVICE_INTERFACE not in interfaces:
+            return
+        with self._lock:
+            mac = self._paths.pop(path, None)
+            self._devices.pop(mac, None)
+            self._proxies.pop(path, None)
+
+    def _on_properties_changed(self, sender, path, iface, signal, params):
+        interface, changed, invalidated = params
+        if interface != self.DEVICE_INTERFACE:
+            return
+        with self._lock:
+            mac = self._paths.get(path)
+            if mac is None:
+                return
+            entry = self._devices[mac]
+            entry['props'].update(changed)
+            for name in invalidated:
+                entry['props'].pop(name, None)
+            if 'UUIDs' in changed:
+                entry['type'] = device_type(entry['props'])
+        self._notify(mac)
+
+    def add_listener(self, callback):
+        """Appelle callback(infos du périphérique) à chaque changement de l'index"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            self._listeners.remove(callback)
+
+    def _notify(self, mac):
+        with self._lock:
+            device_info = self._device_info(mac)
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(device_info)
+
+    def _device_info(self, mac):
+        """Informations affichées pour un périphérique de l'index"""
+        entry = self._devices[mac]
+        device_props = entry['props']
+        return {
+            'mac': device_props.get('Address', 'Unknown'),
+            'name': device_props.get('Name', device_props.get('Alias', 'Unknown')),
+            'connected': device_props.get('Connected', False),
+            'paired': device_props.get('Paired', False),
+            'trusted': device_props.get('Trusted', False),
+            'rssi': device_props.get('RSSI', None),
+            'path': entry['path'],
+            'device_type': entry['type']
+        }
 
-    def scan_devices(self, duration=5):
+    def _find_device_path(self, mac_address):
         """
-        Scanne les périphériques Bluetooth disponibles
+        Trouve le chemin D-Bus d'un périphérique par son adresse MAC
 
         Args:
-            duration: Durée du scan en secondes (défaut: 5)
+            mac_address: Adresse MAC du périphérique
+
+        Returns:
+            Chemin D-Bus du périphérique ou None
+        """
+        with self._lock:
+            entry = self._devices.get(mac_address.upper())
+            return entry['path'] if entry else None
+
+    def _get_device(self, mac_address):
+        """
+        Proxy D-Bus d'un périphérique, créé une seule fois
+
+        Returns:
+            Tuple (proxy, propriétés connues) ou (None, None) si le périphérique est inconnu
+        """
+        with self._lock:
+            entry = self._devices.get(mac_address.upper())
+            if entry is None:
+                return None, None
+            path = entry['path']
+            proxy = self._proxies.get(path)
+            props = dict(entry['props'])
+        if proxy is None:
+            proxy = self.bus.get(self.BLUEZ_SERVICE, path)
+            with self._lock:
+                self._proxies[path] = proxy
+        return proxy, props
+
+    # --- lecture ---
+
+    def get_devices(self):
+        """
+        Périphériques connus de BlueZ, depuis l'index (sans scan ni appel D-Bus)
 
         Returns:
             Liste de dictionnaires contenant les infos des périphériques
         """
         if not self.adapter:
             return []
+        with self._lock:
+            return [self._device_info(mac) for mac in self._devices]
 
-        devices = []
+    def get_connected_devices(self):
+        """
+        Récupère la liste des périphériques connectés
 
-        try:
-            # Démarrer le scan
-            self.adapter.StartDiscovery()
-            time.sleep(duration)
-            self.adapter.StopDiscovery()
-
-            # Récupérer les devices découverts
-            managed_objects = self._get_device_objects()
-
-            for path, interfaces in managed_objects.items():
-                if self.DEVICE_INTERFACE not in interfaces:
-                    continue
-
-                device_props = interfaces[self.DEVICE_INTERFACE]
-
-                # Filtrer les devices qui appartiennent à notre adaptateur
-                if not path.startswith(self.adapter_path):
-                    continue
-
-                device_info = {
-                    'mac': device_props.get('Address', 'Unknown'),
-                    'name': device_props.get('Name', device_props.get('Alias', 'Unknown')),
-                    'connected': device_props.get('Connected', False),
-                    'paired': device_props.get('Paired', False),
-                    'trusted': device_props.get('Trusted', False),
-                    'rssi': device_props.get('RSSI', None),
-                    'path': path,
-                    'device_type': 'unknown'
-                }
-
-                # Déterminer le type de périphérique
-                uuids = device_props.get('UUIDs', [])
-                if any('110b' in uuid.lower() for uuid in uuids):  # A2DP
-                    device_info['device_type'] = 'audio'
-                elif any('1124' in uuid.lower() for uuid in uuids):  # HID
-                    device_info['device_type'] = 'input'
-
-                devices.append(device_info)
-
-            return devices
+        Returns:
+            Liste de dictionnaires contenant les infos des périphériques connectés
+        """
+        return [device for device in self.get_devices() if device['connected']]
 
-        except Exception as e:
-            print(f"Erreur lors du scan Bluetooth: {e}")
-            # Essayer d'arrêter le scan en cas d'erreur
-            try:
-                self.adapter.StopDiscovery()
-            except:
-                pass
-            return []
+    def start_discovery(self, duration=DISCOVERY_DURATION):
+        """
+        Lance une session de découverte, ou renvoie celle en cours
+
+        Returns:
+            DiscoverySession, None si aucun adaptateur n'est disponible
+        """
+        if not self.adapter:
+            return None
+        with self._discovery_lock:
+            if self._discovery is None or self._discovery.done:
+                self._discovery = DiscoverySession(self, duration).start()
+            return self._discovery
+
+    # --- actions ---
 
     def pair_device(self, mac_address):
         """
@@ -123,14 +339,12 @@ class BluetoothManager:
 
         try:
             # Trouver le device
-            device_path = self._find_device_path(mac_address)
-            if not device_path:
+            device, props = self._get_device(mac_address)
+            if device is None:
                 return False, f"Périphérique {mac_address} non trouvé"
 
-            device = self.bus.get(self.BLUEZ_SERVICE, device_path)
-
             # Vérifier si déjà appairé
-            if device.Paired:
+            if props.get('Paired'):
                 # Faire confiance au périphérique
                 device.Trusted = True
                 return True, "Périphérique déjà appairé"
@@ -160,14 +374,12 @@ class BluetoothManager:
             return False, "Adaptateur Bluetooth non trouvé"
 
         try:
-            device_path = self._find_device_path(mac_address)
-            if not device_path:
+            device, props = self._get_device(mac_address)
+            if device is None:
                 return False, f"Périphérique {mac_address} non trouvé"
 
-            device = self.bus.get(self.BLUEZ_SERVICE, device_path)
-
             # Vérifier si déjà connecté
-            if device.Connected:
+            if props.get('Connected'):
                 return True, "Périphérique déjà connecté"
 
             # Se connecter
@@ -192,12 +404,10 @@ class BluetoothManager:
             return False, "Adaptateur Bluetooth non trouvé"
 
         try:
-            device_path = self._find_device_path(mac_address)
-            if not device_path:
+            device, _ = self._get_device(mac_address)
+            if device is None:
                 return False, f"Périphérique {mac_address} non trouvé"
 
-            device = self.bus.get(self.BLUEZ_SERVICE, device_path)
-
             # Se déconnecter
             device.Disconnect()
 
@@ -231,80 +441,3 @@ class BluetoothManager:
 
         except Exception as e:
             return False, f"Erreur de suppression: {str(e)}"
-
-    def get_connected_devices(self):
-        """
-        Récupère la liste des périphériques connectés
-
-        Returns:
-            Liste de dictionnaires contenant les infos des périphériques connectés
-        """
-        if not self.adapter:
-            return []
-
-        connected_devices = []
-
-        try:
-            managed_objects = self._get_device_objects()
-
-            for path, interfaces in managed_objects.items():
-                if self.DEVICE_INTERFACE not in interfaces:
-                    continue
-
-                device_props = interfaces[self.DEVICE_INTERFACE]
-
-                # Filtrer les devices connectés
-                if not device_props.get('Connected', False):
-                    continue
-
-                # Filtrer les devices qui appartiennent à notre adaptateur
-                if not path.startswith(self.adapter_path):
-                    continue
-
-                device_info = {
-                    'mac': device_props.get('Address', 'Unknown'),
-                    'name': device_props.get('Name', device_props.get('Alias', 'Unknown')),
-                    'device_type': 'unknown'
-                }
-
-                # Déterminer le type de périphérique
-                uuids = device_props.get('UUIDs', [])
-                if any('110b' in uuid.lower() for uuid in uuids):  # A2DP
-                    device_info['device_type'] = 'audio'
-                elif any('1124' in uuid.lower() for uuid in uuids):  # HID
-                    device_info['device_type'] = 'input'
-
-                connected_devices.append(device_info)
-
-            return connected_devices
-
-        except Exception as e:
-            print(f"Erreur lors de la récupération des devices connectés: {e}")
-            return []
-
-    def _find_device_path(self, mac_address):
-        """
-        Trouve le chemin D-Bus d'un périphérique par son adresse MAC
-
-        Args:
-            mac_address: Adresse MAC du périphérique
-
-        Returns:
-            Chemin D-Bus du périphérique ou None
-        """
-        try:
-            managed_objects = self._get_device_objects()
-
-            for path, interfaces in managed_objects.items():
-                if self.DEVICE_INTERFACE not in interfaces:
-                    continue
-
-                device_props = interfaces[self.DEVICE_INTERFACE]
-                if device_props.get('Address', '').upper() == mac_address.upper():
-                    return path
-
-            return None
-
-        except Exception as e:
-            print(f"Erreur lors de la recherche du device: {e}")
-            return None
@@ -0,0 +1,162 @@
+"""
+Bus D-Bus factice pour utiliser BluetoothManager sans BlueZ
+
+FakeBus imite le sous-ensemble de pydbus dont BluetoothManager a besoin
+(get, subscribe, proxies de l'adaptateur et des périphériques). Les actions
+modifient l'état du bus et émettent les mêmes signaux que BlueZ, de façon
+synchrone. Le nombre d'appels par méthode est compté dans FakeBus.calls.
+
+Exemple:
+    bus = FakeBus()
+    path = bus.add_device('AA:BB:CC:DD:EE:FF', Name='Casque', UUIDs=['0000110b-0000-1000-8000-00805f9b34fb'])
+    manager = BluetoothManager(bus=bus)
+    manager.pair_device('aa:bb:cc:dd:ee:ff')
+"""
+import copy
+from collections import Counter
+
+BLUEZ_SERVICE = 'org.bluez'
+ADAPTER_INTERFACE = 'org.bluez.Adapter1'
+DEVICE_INTERFACE = 'org.bluez.Device1'
+OBJECT_MANAGER_INTERFACE = 'org.freedesktop.DBus.ObjectManager'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+
+
+class FakeSubscription:
+    def __init__(self, bus, entry):
+        self._bus = bus
+        self._entry = entry
+
+    def unsubscribe(self):
+        if self._entry in self._bus.subscriptions:
+            self._bus.subscriptions.remove(self._entry)
+
+
+class FakeObjectManager:
+    """Objet racine de BlueZ"""
+
+    def __init__(self, bus):
+        self._bus = bus
+
+    def GetManagedObjects(self):
+        self._bus.calls['GetManagedObjects'] += 1
+        return copy.deepcopy(self._bus.objects)
+
+
+class FakeAdapter:
+    """Proxy de org.bluez.Adapter1"""
+
+    def __init__(self, bus, path):
+        self._bus = bus
+        self._path = path
+
+    def StartDiscovery(self):
+        self._bus.calls['StartDiscovery'] += 1
+        self._bus.set_property(self._path, 'Discovering', True, ADAPTER_INTERFACE)
+
+    def StopDiscovery(self):
+        self._bus.calls['StopDiscovery'] += 1
+        self._bus.set_property(self._path, 'Discovering', False, ADAPTER_INTERFACE)
+
+    def RemoveDevice(self, path):
+        self._bus.calls['RemoveDevice'] += 1
+        self._bus.remove_device(path)
+
+
+class FakeDevice:
+    """Proxy de org.bluez.Device1 : propriétés en attributs, méthodes Pair, Connect..."""
+
+    def __init__(self, bus, path):
+        object.__setattr__(self, '_bus', bus)
+        object.__setattr__(self, '_path', path)
+
+    def __getattr__(self, name):
+        self._bus.calls['Get'] += 1
+        try:
+            return self._bus.objects[self._path][DEVICE_INTERFACE][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self._bus.calls['Set'] += 1
+        self._bus.set_property(self._path, name, value)
+
+    def _call(self, method):
+        self._bus.calls[method] += 1
+        error = self._bus.errors.get((self._path, method))
+        if error is not None:
+            raise error
+
+    def Pair(self):
+        self._call('Pair')
+        self._bus.set_property(self._path, 'Paired', True)
+
+    def Connect(self):
+        self._call('Connect')
+        self._bus.set_property(self._path, 'Connected', True)
+
+    def Disconnect(self):
+        self._call('Disconnect')
+        self._bus.set_property(self._path, 'Connected', False)
+
+
+class FakeBus:
+    """Bus système factice avec un adaptateur BlueZ"""
+
+    def __init__(self, adapter='hci0'):
+        self.adapter_path = f'/org/bluez/{adapter}'
+        self.objects = {self.adapter_path: {ADAPTER_INTERFACE: {'Discovering': False}}}
+        self.subscriptions = []
+        self.calls = Counter()
+        # erreurs à lever : (chemin, méthode) -> exception
+        self.errors = {}
+
+    def get(self, service, path='/'):
+        self.calls['get'] += 1
+        if path == '/':
+            return FakeObjectManager(self)
+        if path == self.adapter_path:
+            return FakeAdapter(self, path)
+        if path in self.objects:
+            return FakeDevice(self, path)
+        raise KeyError(path)
+
+    def subscribe(self, sender=None, iface=None, signal=None, object=None, arg0=None, flags=0,
+                  signal_fired=None):
+        entry = (iface, signal, object, signal_fired)
+        self.subscriptions.append(entry)
+        return FakeSubscription(self, entry)
+
+    def emit(self, path, iface, signal, params):
+        """Émet un signal vers les abonnés correspondants"""
+        for sub_iface, sub_signal, sub_object, callback in list(self.subscriptions):
+            if sub_iface not in (None, iface) or sub_signal not in (None, signal):
+                continue
+            if sub_object not in (None, path):
+                continue
+            callback(BLUEZ_SERVICE, path, iface, signal, params)
+
+    def add_device(self, mac, **props):
+        """
+        Ajoute un périphérique (comme une découverte de BlueZ)
+
+        Returns:
+            Chemin D-Bus du périphérique
+        """
+        path = f"{self.adapter_path}/dev_{mac.upper().replace(':', '_')}"
+        props = {'Address': mac.upper(), 'Alias': mac.upper(), 'Paired': False,
+                 'Connected': False, 'Trusted': False, 'UUIDs': [], **props}
+        self.objects[path] = {DEVICE_INTERFACE: props}
+        self.emit('/', OBJECT_MANAGER_INTERFACE, 'InterfacesAdded',
+                  (path, {DEVICE_INTERFACE: dict(props)}))
+        return path
+
+    def set_property(self, path, name, value, interface=DEVICE_INTERFACE):
+        """Modifie une propriété et émet PropertiesChanged"""
+        self.objects[path][interface][name] = value
+        self.emit(path, PROPERTIES_INTERFACE, 'PropertiesChanged', (interface, {name: value}, []))
+
+    def remove_device(self, path):
+        """Supprime un périphérique et émet InterfacesRemoved"""
+        interfaces = self.objects.pop(path)
+        self.emit('/', OBJECT_MANAGER_INTERFACE, 'InterfacesRemoved', (path, list(interfaces)))
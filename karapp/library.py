@@ -0,0 +1,501 @@
+"""
+Synchronisation de la bibliothèque locale (photos, musique) avec la table files
+
+La synchronisation est incrémentale : la taille, la date de modification et
+l'inode de chaque fichier sont enregistrés dans FileModel, et seuls les fichiers
+nouveaux ou modifiés depuis la dernière synchronisation sont relus.
+
+L'extraction des métadonnées et des miniatures peut être répartie sur plusieurs
+processus ; les résultats reviennent au thread appelant, seul à écrire en base.
+"""
+import base64
+import multiprocessing
+import os
+import pickle
+import stat
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+
+from sqlalchemy import delete, insert, inspect, select, text, update
+
+from karapp.models import db, FileModel
+from karapp.tools.media import detect_mimetype
+from karapp.tools.music import get_metadata
+
+SYNC_CATEGORIES = ['photo', 'musique']
+# une seule synchronisation (complète ou partielle) à la fois
+SYNC_LOCK = threading.Lock()
+# taille des lots d'écriture (limite de paramètres des anciennes versions de SQLite)
+BATCH_SIZE = 500
+
+
+class SyncCancelled(Exception):
+    """Synchronisation interrompue à la demande de l'utilisateur"""
+
+
+def chunks(seq, size=BATCH_SIZE):
+    """Découpe une liste en lots de taille size"""
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def file_signature(st):
+    """Signature (taille, mtime, inode) d'un fichier à partir de son stat"""
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def walk(root, errors=None):
+    """
+    Parcourt récursivement un dossier avec os.scandir
+
+    Args:
+        root: Dossier à parcourir
+        errors: Liste complétée avec les dossiers existants qui n'ont pas pu
+            être lus (leur contenu est absent du parcours)
+
+    Returns:
+        Générateur de tuples (path, is_dir, stat), chaque dossier étant renvoyé
+        avant son contenu
+    """
+    stack = [str(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except (FileNotFoundError, NotADirectoryError):
+            # dossier supprimé pendant le parcours : son contenu a vraiment disparu
+            continue
+        except OSError as e:
+            print(f"Erreur lors du parcours de {current}: {e}")
+            if errors is not None:
+                errors.append(current)
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+                st = entry.stat()
+            except OSError:
+                continue
+            yield entry.path, is_dir, st
+            if is_dir:
+                subdirs.append(entry.path)
+        stack.extend(reversed(subdirs))
+
+
+def extract_file_infos(path, category, thumbs):
+    """
+    Extrait les informations affichées dans la bibliothèque pour un fichier
+
+    Args:
+        path: Chemin du fichier
+        category: Catégorie du fichier (photo, musique)
+        thumbs: ThumbnailStore où enregistrer la miniature
+
+    Returns:
+        Dictionnaire avec name, artwork_hash, artist, album et mimetype
+    """
+    infos = {'name': None, 'artwork_hash': None, 'artist': None, 'album': None,
+             'mimetype': detect_mimetype(path)}
+    if category == 'musique':
+        meta = get_metadata(path)
+        if meta:
+            infos['name'] = meta['title']
+            infos['artist'] = meta['artist']
+            infos['album'] = meta['album']
+            infos['artwork_hash'] = thumbs.put_artwork(meta['artwork'])
+    elif category == 'photo':
+        infos['name'] = Path(path).name.split('.')[0]
+        # variante plein écran pour la visionneuse, créée pendant le même décodage
+        infos['artwork_hash'] = thumbs.put_artwork(path, variants=('viewer',))
+    return infos
+
+
+def _extract_job(job, thumbs):
+    path, category = job
+    return path, extract_file_infos(path, category, thumbs)
+
+
+def extract_all(jobs, thumbs, workers=1):
+    """
+    Extrait les informations d'une liste de fichiers
+
+    Args:
+        jobs: Liste de tuples (path, category)
+        thumbs: ThumbnailStore où enregistrer les miniatures
+        workers: Nombre de processus d'extraction (1 = mode série)
+
+    Returns:
+        Générateur de tuples (path, infos)
+    """
+    extract = partial(_extract_job, thumbs=thumbs)
+    if workers > 1 and len(jobs) > 1:
+        done = set()
+        chunksize = max(1, min(32, len(jobs) // (workers * 4)))
+        executor = None
+        try:
+            # fork est risqué depuis un processus qui a des threads (serveur,
+            # téléchargements) : un verrou pris au moment du fork bloquerait l'enfant
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            executor = ProcessPoolExecutor(max_workers=workers,
+                                           mp_context=multiprocessing.get_context(method))
+            for path, infos in executor.map(extract, jobs, chunksize=chunksize):
+                done.add(path)
+                yield path, infos
+            return
+        except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+            print(f"Extraction parallèle indisponible, passage en mode série: {e}")
+            jobs = [job for job in jobs if job[0] not in done]
+        finally:
+            # ne pas attendre les fichiers restants si l'extraction est interrompue
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    for job in jobs:
+        yield extract(job)
+
+
+def sync_library(data_path, thumbs, full=False, workers=1, progress=None, cancel=None):
+    """
+    Synchronise la table files avec le contenu de data_path
+
+    Les fichiers sont enregistrés par lots au fil de l'extraction : une
+    synchronisation interrompue conserve les fichiers déjà traités.
+
+    Args:
+        data_path: Dossier racine de la bibliothèque
+        thumbs: ThumbnailStore où enregistrer les miniatures
+        full: Relire les métadonnées de tous les fichiers, modifiés ou non
+        workers: Nombre de processus pour l'extraction des métadonnées
+        progress: Fonction appelée avec les statistiques en cours
+        cancel: threading.Event demandant l'arrêt de la synchronisation
+
+    Returns:
+        Dictionnaire de statistiques (scanned, total, extracted, committed,
+        added, updated, removed)
+
+    Raises:
+        SyncCancelled: si cancel a été déclenché
+    """
+    stats = _new_stats()
+
+    # Index des fichiers connus, chargé en une seule requête
+    rows = db.session.execute(_known_files_query()).all()
+    known = {row.path: row for row in rows}
+    ids = {row.path: row.id for row in rows}
+    # dossiers illisibles : leur contenu n'est pas vu mais existe peut-être encore
+    unreadable = []
+
+    def entries():
+        for category in SYNC_CATEGORIES:
+            for path, is_dir, st in walk(Path(data_path) / category, errors=unreadable):
+                yield path, category, is_dir, st
+
+    seen = _apply_entries(entries(), known, ids, thumbs, full, workers, stats, progress, cancel)
+
+    # retirer ceux qui n'existent plus
+    removed = []
+    for row in rows:
+        if row.category in SYNC_CATEGORIES:
+            missing = row.path not in seen and not any(
+                row.path.startswith(d + os.sep) for d in unreadable)
+        else:
+            missing = not os.path.exists(row.path)
+        if missing:
+            removed.append(row.id)
+    stats['removed'] = delete_files(removed)
+
+    db.session.commit()
+    if progress:
+        progress(stats)
+    return stats
+
+
+def sync_paths(data_path, paths, thumbs, workers=1):
+    """
+    Applique à la table files les changements de quelques chemins seulement
+
+    Args:
+        data_path: Dossier racine de la bibliothèque
+        paths: Chemins créés, modifiés ou supprimés (un dossier est parcouru)
+        thumbs: ThumbnailStore où enregistrer les miniatures
+        workers: Nombre de processus pour l'extraction des métadonnées
+
+    Returns:
+        Dictionnaire de statistiques (voir sync_library)
+    """
+    stats = _new_stats()
+    root = Path(data_path)
+    found = []
+    walked = []
+    vanished = []
+
+    for path in sorted(set(map(str, paths))):
+        category = _category_of(root, path)
+        # les chemins imbriqués sont couverts par le parcours de leur dossier
+        if category is None or any(path.startswith(d + os.sep) for d in walked):
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            vanished.append(path)
+            continue
+        is_dir = stat.S_ISDIR(st.st_mode)
+        found.append((path, category, is_dir, st))
+        if is_dir:
+            walked.append(path)
+            found.extend((p, category, d, s) for p, d, s in walk(path))
+
+    # lignes connues pour ces chemins et leurs dossiers parents
+    lookup = {p for p, *_ in found} | {os.path.dirname(p) for p, *_ in found}
+    rows = []
+    for batch in chunks(sorted(lookup)):
+        rows.extend(db.session.execute(
+            _known_files_query().where(FileModel.path.in_(batch))).all())
+    known = {row.path: row for row in rows}
+    ids = {row.path: row.id for row in rows}
+
+    _apply_entries(found, known, ids, thumbs, False, workers, stats)
+
+    # un chemin supprimé emporte son contenu ; un dossier et son contenu
+    # peuvent être signalés ensemble, d'où l'ensemble
+    removed = set()
+    for path in vanished:
+        removed.update(db.session.execute(select(FileModel.id).where(
+            (FileModel.path == path) | FileModel.path.startswith(path + os.sep, autoescape=True)
+        )).scalars())
+    stats['removed'] = delete_files(removed)
+
+    db.session.commit()
+    return stats
+
+
+def _new_stats():
+    return {'scanned': 0, 'total': 0, 'extracted': 0, 'committed': 0,
+            'added': 0, 'updated': 0, 'removed': 0}
+
+
+def _category_of(root, path):
+    """Catégorie synchronisée contenant path, None si path est hors bibliothèque"""
+    try:
+        parts = Path(path).relative_to(root).parts
+    except ValueError:
+        return None
+    if len(parts) < 2 or parts[0] not in SYNC_CATEGORIES:
+        return None
+    return parts[0]
+
+
+def _known_files_query():
+    return select(FileModel.id, FileModel.path, FileModel.category,
+                  FileModel.size, FileModel.mtime, FileModel.inode)
+
+
+def _apply_entries(entries, known, ids, thumbs, full, workers, stats, progress=None, cancel=None):
+    """
+    Insère ou met à jour les fichiers parcourus
+
+    Args:
+        entries: Tuples (path, category, is_dir, stat), dossiers avant leur contenu
+        known: Lignes connues, par chemin
+        ids: Correspondance path -> id, complétée avec les dossiers insérés
+        progress: Fonction appelée avec les statistiques en cours
+        cancel: threading.Event demandant l'arrêt
+
+    Returns:
+        Ensemble des chemins parcourus
+    """
+    def check_cancel():
+        if cancel is not None and cancel.is_set():
+            raise SyncCancelled()
+
+    seen = set()
+    new_dirs = []
+    # fichiers à (re)lire : path -> (category, row, signature)
+    pending = {}
+    backfill = []
+
+    for path, category, is_dir, st in entries:
+        stats['scanned'] += 1
+        if stats['scanned'] % 100 == 0:
+            check_cancel()
+            if progress:
+                progress(stats)
+        seen.add(path)
+        row = known.get(path)
+        size, mtime, inode = file_signature(st)
+
+        if is_dir:
+            if row is None:
+                new_dirs.append({'type': 'dir', 'category': category, 'path': path,
+                                 'name': os.path.basename(path), 'inode': inode})
+            continue
+
+        signature = {'size': size, 'mtime': mtime, 'inode': inode}
+        if row is None or full:
+            pending[path] = (category, row, signature)
+        elif (row.size, row.mtime, row.inode) != (size, mtime, inode):
+            if row.size is None:
+                # les lignes créées avant l'enregistrement des signatures
+                # sont seulement complétées
+                backfill.append({'id': row.id, **signature})
+            else:
+                pending[path] = (category, row, signature)
+
+    check_cancel()
+    stats['total'] = len(pending)
+
+    # nouveaux dossiers, par niveau de profondeur pour connaître l'id du parent
+    stats['added'] += insert_dirs(new_dirs, ids)
+
+    for batch in chunks(backfill):
+        db.session.execute(update(FileModel), batch)
+    db.session.commit()
+    if progress:
+        progress(stats)
+
+    # extraction (éventuellement parallèle), écriture par lots par ce seul thread
+    jobs = [(path, category) for path, (category, _, _) in pending.items()]
+    inserts, updates = [], []
+
+    def commit():
+        stats['added'] += len(inserts)
+        stats['updated'] += len(updates)
+        stats['committed'] += len(inserts) + len(updates)
+        _flush_inserts(inserts)
+        _flush_updates(updates)
+        db.session.commit()
+
+    with closing(extract_all(jobs, thumbs, workers)) as results:
+        for path, infos in results:
+            stats['extracted'] += 1
+            category, row, signature = pending[path]
+            if row is None:
+                inserts.append({'type': 'file', 'category': category, 'path': path,
+                                'parent': ids.get(os.path.dirname(path)),
+                                **signature, **infos})
+            else:
+                updates.append({'id': row.id, **signature, **infos})
+            if len(inserts) + len(updates) >= BATCH_SIZE:
+                commit()
+            if progress:
+                progress(stats)
+            if cancel is not None and cancel.is_set():
+                # conserver les fichiers déjà extraits
+                commit()
+                raise SyncCancelled()
+    commit()
+    return seen
+
+
+def insert_dirs(new_dirs, ids):
+    """
+    Insère des dossiers parents avant enfants et complète ids (path -> id)
+
+    Returns:
+        Nombre de dossiers insérés
+    """
+    levels = {}
+    for values in new_dirs:
+        levels.setdefault(values['path'].count(os.sep), []).append(values)
+
+    for depth in sorted(levels):
+        level = levels[depth]
+        for values in level:
+            values['parent'] = ids.get(os.path.dirname(values['path']))
+        for batch in chunks(level):
+            db.session.execute(insert(FileModel), batch)
+            paths = [values['path'] for values in batch]
+            # un Result a une méthode keys() : dict.update le prendrait pour un dictionnaire
+            ids.update(dict(db.session.execute(
+                select(FileModel.path, FileModel.id).where(FileModel.path.in_(paths))
+            ).tuples().all()))
+    return len(new_dirs)
+
+
+def delete_files(file_ids):
+    """
+    Supprime des lignes de la table files par lots
+
+    Returns:
+        Nombre de lignes supprimées
+    """
+    for batch in chunks(list(file_ids)):
+        db.session.execute(delete(FileModel).where(FileModel.id.in_(batch)))
+    return len(file_ids)
+
+
+def _flush_inserts(inserts):
+    count = len(inserts)
+    if inserts:
+        db.session.execute(insert(FileModel), inserts)
+        inserts.clear()
+    return count
+
+
+def _flush_updates(updates):
+    count = len(updates)
+    if updates:
+        db.session.execute(update(FileModel), updates)
+        updates.clear()
+    return count
+
+
+def migrate_artwork(conn, thumbs):
+    """
+    Déplace les miniatures base64 de l'ancienne colonne artwork vers le
+    ThumbnailStore, puis supprime la colonne
+
+    Exécutée une seule fois par la migration _artwork_to_store.
+
+    Args:
+        conn: Connexion ouverte dans la transaction de la migration
+        thumbs: ThumbnailStore de destination
+
+    Returns:
+        Nombre de miniatures converties
+    """
+    columns = {c['name'] for c in inspect(conn).get_columns(FileModel.__tablename__)}
+    if 'artwork' not in columns:
+        return 0
+
+    converted = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, artwork FROM files WHERE artwork IS NOT NULL AND id > :last_id '
+            'ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            break
+        updates = []
+        for file_id, artwork in rows:
+            try:
+                data = base64.b64decode(artwork)
+            except ValueError:
+                continue
+            # les miniatures JPEG déjà réduites sont conservées telles quelles,
+            # les pochettes de musique (image originale) sont réduites
+            if data[:2] == b'\xff\xd8' and len(data) <= 64 * 1024:
+                digest = thumbs.put(data)
+            else:
+                digest = thumbs.put_artwork(data)
+            updates.append({'id': file_id, 'artwork_hash': digest})
+        if updates:
+            conn.execute(text('UPDATE files SET artwork_hash = :artwork_hash WHERE id = :id'), updates)
+            converted += len(updates)
+        last_id = rows[-1][0]
+
+    try:
+        conn.execute(text('ALTER TABLE files DROP COLUMN artwork'))
+    except Exception:
+        # SQLite < 3.35 : la colonne est seulement vidée, s'il reste quelque chose à vider
+        if converted:
+            conn.execute(text('UPDATE files SET artwork = NULL'))
+    return converted
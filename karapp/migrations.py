@@ -0,0 +1,133 @@
+"""
+Migrations du schéma de la base SQLite
+
+db.create_all() crée les tables manquantes mais ne modifie pas une table
+existante. La version du schéma est enregistrée dans PRAGMA user_version et
+chaque migration de MIGRATIONS fait passer la base à la version suivante.
+Les migrations sont idempotentes : une base créée avant l'introduction des
+versions (user_version = 0) peut toutes les rejouer.
+
+Une migration qui libère beaucoup de place renvoie True : la base est alors
+compactée (VACUUM) une fois toutes les migrations passées.
+"""
+from sqlalchemy import inspect
+
+from karapp.models import db
+
+
+def _add_columns(conn, table, columns):
+    """Ajoute à une table les colonnes (nom -> type SQL) qui lui manquent"""
+    existing = {c['name'] for c in inspect(conn).get_columns(table)}
+    for name, ctype in columns.items():
+        if name not in existing:
+            conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {name} {ctype}')
+
+
+def _file_signatures(conn):
+    """Signature (taille, mtime, inode) utilisée par la synchronisation incrémentale"""
+    _add_columns(conn, 'files', {'size': 'BIGINT', 'mtime': 'BIGINT', 'inode': 'BIGINT'})
+
+
+def _artwork_hash(conn):
+    """Référence vers le ThumbnailStore (les données sont converties par _artwork_to_store)"""
+    _add_columns(conn, 'files', {'artwork_hash': 'VARCHAR(40)'})
+
+
+def _files_indexes(conn):
+    """Index des recherches par chemin, par dossier et unicité des chemins"""
+    # rattacher les enfants au plus ancien des doublons, puis supprimer les doublons
+    conn.exec_driver_sql(
+        'UPDATE files SET parent = ('
+        '  SELECT MIN(d.id) FROM files d JOIN files p ON p.path = d.path WHERE p.id = files.parent'
+        ') WHERE parent IS NOT NULL'
+    )
+    conn.exec_driver_sql('DELETE FROM files WHERE id NOT IN (SELECT MIN(id) FROM files GROUP BY path)')
+    conn.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS ix_files_path ON files (path)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_files_category_parent ON files (category, parent)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_files_parent_name ON files (parent, name)')
+
+
+def _podcast_refresh(conn):
+    """GUID des épisodes et téléchargement automatique des podcasts"""
+    _add_columns(conn, 'files', {'guid': 'VARCHAR(500)',
+                                 'auto_download': 'BOOLEAN NOT NULL DEFAULT 0'})
+
+
+def _file_mimetypes(conn):
+    """Type MIME des fichiers (les lignes existantes sont complétées à la lecture)"""
+    _add_columns(conn, 'files', {'mimetype': 'VARCHAR(100)'})
+
+
+def _podcast_last_seen(conn):
+    """Repère du dernier épisode vu par l'actualisation des podcasts"""
+    _add_columns(conn, 'files', {'last_seen_guid': 'VARCHAR(500)'})
+
+
+def _artwork_to_store(conn, thumbs):
+    """Miniatures base64 de l'ancienne colonne artwork déplacées vers le ThumbnailStore"""
+    # import tardif : la bibliothèque n'est utile qu'aux bases à convertir
+    from karapp.library import migrate_artwork
+
+    if thumbs is None:
+        raise RuntimeError('ThumbnailStore requis pour convertir les miniatures')
+    return migrate_artwork(conn, thumbs) > 0
+
+
+# La position dans la liste donne la version atteinte après la migration
+MIGRATIONS = [
+    _file_signatures,
+    _artwork_hash,
+    _files_indexes,
+    _podcast_refresh,
+    _file_mimetypes,
+    _podcast_last_seen,
+    _artwork_to_store,
+]
+
+# migrations qui reçoivent aussi le ThumbnailStore
+STORE_MIGRATIONS = {_artwork_to_store}
+
+
+def get_version(conn):
+    return conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def set_version(conn, version):
+    conn.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+
+
+def upgrade_db(thumbs=None):
+    """
+    Crée ou met à jour le schéma de la base
+
+    Args:
+        thumbs: ThumbnailStore, nécessaire pour convertir les anciennes miniatures
+
+    Returns:
+        Version du schéma
+    """
+    with db.engine.connect() as conn:
+        version = get_version(conn)
+        fresh = not inspect(conn).has_table('files')
+
+    # une base neuve est créée directement à la dernière version
+    db.create_all()
+    if fresh:
+        version = len(MIGRATIONS)
+        with db.engine.begin() as conn:
+            set_version(conn, version)
+        return version
+
+    vacuum = False
+    for version, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f'Migration de la base vers la version {version}: {migration.__doc__}')
+        with db.engine.begin() as conn:
+            if migration in STORE_MIGRATIONS:
+                vacuum = migration(conn, thumbs) or vacuum
+            else:
+                vacuum = migration(conn) or vacuum
+            set_version(conn, version)
+    if vacuum:
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM')
+    return len(MIGRATIONS)
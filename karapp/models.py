@@ -5,14 +5,29 @@ db = SQLAlchemy()
 
 class FileModel(db.Model):
     __tablename__ = 'files'
+    __table_args__ = (
+        db.Index('ix_files_category_parent', 'category', 'parent'),
+        db.Index('ix_files_parent_name', 'parent', 'name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50), nullable=False)
     category = db.Column(db.String(50), nullable=False)
-    path = db.Column(db.String(500), nullable=False)
-    artwork = db.Column(db.Text)  # Base64 encoded artwork
+    path = db.Column(db.String(500), nullable=False, unique=True, index=True)
+    artwork_hash = db.Column(db.String(40))  # miniature dans le ThumbnailStore
     parent = db.Column(db.Integer, ForeignKey('files.id'))
     url = db.Column(db.String(500))
     description = db.Column(db.Text)
     album = db.Column(db.String(50))
     artist = db.Column(db.String(50))
     name = db.Column(db.String(50))
+    mimetype = db.Column(db.String(100))  # détecté lors de l'indexation
+    # podcasts : identifiant de l'épisode dans le flux, téléchargement automatique
+    guid = db.Column(db.String(500))
+    auto_download = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+    # podcasts : GUID du plus récent épisode du flux déjà vu (abonnement ou actualisation)
+    last_seen_guid = db.Column(db.String(500))
+    # Signature du fichier lors de la dernière synchronisation
+    size = db.Column(db.BigInteger)
+    mtime = db.Column(db.BigInteger)  # st_mtime_ns
+    inode = db.Column(db.BigInteger)
+
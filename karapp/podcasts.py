@@ -0,0 +1,130 @@
+"""
+Actualisation périodique des podcasts abonnés
+
+Chaque podcast (dossier de la catégorie podcast avec une url de flux) est
+actualisé une fois par intervalle, à un moment tiré au hasard pour que toutes
+les actualisations ne partent pas en même temps. Le GUID du plus récent
+épisode vu est enregistré à l'abonnement et à chaque actualisation : seuls les
+épisodes publiés depuis sont nouveaux, et téléchargés si le podcast est en
+téléchargement automatique.
+"""
+import random
+import threading
+import time
+
+from sqlalchemy import select
+
+from karapp.models import db, FileModel
+from karapp.tools import rss
+
+
+def find_new_episodes(podcast):
+    """
+    Épisodes publiés depuis la dernière actualisation d'un podcast
+
+    Le flux est parcouru du plus récent au plus ancien et le parcours s'arrête
+    au dernier épisode vu (podcast.last_seen_guid) ou à un épisode déjà
+    téléchargé : l'historique n'est pas relu. Un podcast sans repère (abonné
+    avant son introduction) n'a aucun nouvel épisode, son repère est posé.
+
+    Args:
+        podcast: FileModel du dossier du podcast
+
+    Returns:
+        Tuple (nouveaux épisodes, GUID du plus récent épisode du flux ou None) ;
+        les épisodes sont des dictionnaires de rss.get_episodes_list
+    """
+    episodes = rss.get_episodes_list(podcast.url) or []
+    if not episodes:
+        return [], None
+    newest = episodes[0]['guid']
+    if podcast.last_seen_guid is None:
+        return [], newest
+
+    rows = db.session.execute(
+        select(FileModel.guid, FileModel.name).where(FileModel.parent == podcast.id)
+    ).all()
+    known_guids = {row.guid for row in rows if row.guid} | {podcast.last_seen_guid}
+    # les épisodes téléchargés avant l'enregistrement des GUID sont reconnus par leur titre
+    known_titles = {row.name for row in rows}
+
+    new = []
+    for episode in episodes:
+        if episode['guid'] in known_guids or episode['titre'] in known_titles:
+            break
+        new.append(episode)
+    return new, newest
+
+
+class PodcastRefresher(threading.Thread):
+    """Thread qui actualise les podcasts abonnés à intervalle régulier"""
+
+    def __init__(self, app, submit, interval=6 * 3600):
+        """
+        Args:
+            app: Application Flask (pour le contexte de la base)
+            submit: Fonction (titres, url du flux) qui lance un téléchargement
+            interval: Intervalle d'actualisation de chaque podcast en secondes
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.app = app
+        self.submit = submit
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._schedule = {}  # id du podcast -> prochaine actualisation (time.monotonic)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    self._refresh_due()
+            except Exception as e:
+                print(f"Erreur lors de l'actualisation des podcasts: {e}")
+
+            now = time.monotonic()
+            next_run = min(self._schedule.values(), default=now + 60)
+            self._stop_event.wait(min(max(next_run - now, 5), 300))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _refresh_due(self):
+        podcast_ids = set(db.session.execute(
+            select(FileModel.id).where(FileModel.category == 'podcast', FileModel.type == 'dir',
+                                       FileModel.url.is_not(None))
+        ).scalars())
+
+        now = time.monotonic()
+        for podcast_id in list(self._schedule):
+            if podcast_id not in podcast_ids:
+                del self._schedule[podcast_id]
+        for podcast_id in podcast_ids - self._schedule.keys():
+            # première actualisation étalée sur tout l'intervalle
+            self._schedule[podcast_id] = now + random.uniform(0, self.interval)
+
+        for podcast_id, due in list(self._schedule.items()):
+            if due > now or self._stop_event.is_set():
+                continue
+            self.refresh(podcast_id)
+            self._schedule[podcast_id] = time.monotonic() + self.interval * random.uniform(0.9, 1.1)
+
+    def refresh(self, podcast_id):
+        """Actualise un podcast et lance le téléchargement de ses nouveaux épisodes"""
+        podcast = db.session.get(FileModel, podcast_id)
+        if podcast is None:
+            return
+        try:
+            new, newest = find_new_episodes(podcast)
+        except Exception as e:
+            print(f"Erreur lors de l'actualisation de {podcast.name}: {e}")
+            return
+        # les épisodes vus ne sont plus jamais signalés, téléchargés ou non
+        if newest is not None and newest != podcast.last_seen_guid:
+            podcast.last_seen_guid = newest
+            db.session.commit()
+        if not new:
+            return
+
+        print(f"{podcast.name}: {len(new)} nouvel(s) épisode(s)")
+        if podcast.auto_download:
+            self.submit([episode['titre'] for episode in new], podcast.url)
@@ -0,0 +1,72 @@
+"""
+Mesure du temps de démarrage
+
+L'application est importée dans un nouvel interpréteur lancé avec
+python -X importtime : le rapport donne le temps d'import par paquet, les
+imports les plus lents et la durée de la vérification du schéma (init_db).
+Utilisation : python karadoc.py --startup-report
+"""
+import re
+import subprocess
+import sys
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+PROBE = (
+    'import time\n'
+    't0 = time.perf_counter()\n'
+    'import {module} as app\n'
+    't1 = time.perf_counter()\n'
+    'app.init_db()\n'
+    'print("STARTUP", t1 - t0, time.perf_counter() - t1)\n'
+)
+
+
+def measure(module='karapp.app'):
+    """
+    Importe l'application dans un nouvel interpréteur
+
+    Args:
+        module: Module à importer, qui doit fournir init_db()
+
+    Returns:
+        Tuple (imports, durée de l'import, durée de init_db) où imports est la
+        liste des (nom, temps propre, temps cumulé, profondeur), en secondes
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module)],
+                            capture_output=True, text=True)
+    timings = [line for line in result.stdout.splitlines() if line.startswith('STARTUP ')]
+    if result.returncode != 0 or not timings:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip()
+                           else f"échec de l'import de {module}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2))
+    _, import_time, init_time = timings[-1].split()
+    return imports, float(import_time), float(init_time)
+
+
+def report(module='karapp.app', limit=15):
+    """Affiche le rapport de démarrage"""
+    imports, import_time, init_time = measure(module)
+
+    packages = {}
+    for name, self_time, _, _ in imports:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_time
+
+    print(f"Import de {module} : {import_time * 1000:.0f} ms")
+    print(f"Vérification du schéma (init_db) : {init_time * 1000:.0f} ms")
+    print()
+    print("Temps d'import par paquet :")
+    for package, total in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:limit]:
+        print(f"  {total * 1000:8.1f} ms  {package}")
+    print()
+    print("Imports les plus lents (temps cumulé) :")
+    slowest = sorted(imports, key=lambda i: i[2], reverse=True)
+    for name, _, cumulative, depth in slowest[:limit]:
+        print(f"  {cumulative * 1000:8.1f} ms  {'  ' * depth}{name}")
@@ -0,0 +1,63 @@
+/**
+ * Découverte Bluetooth en direct sur /bluetooth_settings
+ * - les appareils connus sont déjà affichés par le serveur
+ * - les appareils trouvés ou modifiés arrivent par /bluetooth/discover (Server-Sent Events)
+ * - une action (appairage, connexion...) en cours est suivie jusqu'à son résultat
+ */
+
+const deviceList = document.getElementById('available-devices');
+const deviceTemplate = document.getElementById('device-template');
+const DEVICE_ICONS = { audio: '🎧', input: '⌨️' };
+
+function findDevice(mac) {
+    return Array.from(deviceList.querySelectorAll('.bluetooth-device'))
+        .find(row => row.dataset.mac === mac);
+}
+
+function createDevice(device) {
+    const row = deviceTemplate.content.firstElementChild.cloneNode(true);
+    row.dataset.mac = device.mac;
+    row.querySelectorAll('input[name="mac"]').forEach(input => input.value = device.mac);
+    row.querySelector('.device-details').textContent = `${device.mac} | Bluetooth`;
+    deviceList.appendChild(row);
+    return row;
+}
+
+function updateDevice(device) {
+    let row = findDevice(device.mac);
+    if (device.connected) {
+        // les appareils connectés sont affichés dans leur propre section
+        if (row) row.remove();
+        return;
+    }
+    if (!row) row = createDevice(device);
+
+    row.querySelector('.device-label').textContent = device.name;
+    row.querySelector('.device-icon').textContent = DEVICE_ICONS[device.device_type] || '📱';
+    row.querySelector('.paired-badge').style.display = device.paired ? '' : 'none';
+    row.querySelector('.action-pair').style.display = device.paired ? 'none' : 'inline';
+    row.querySelectorAll('.action-paired').forEach(form => {
+        form.style.display = device.paired ? 'inline' : 'none';
+    });
+    document.getElementById('no-devices').style.display = 'none';
+}
+
+if (deviceList && 'EventSource' in window) {
+    const source = new EventSource(deviceList.dataset.discoverUrl);
+    source.onmessage = event => updateDevice(JSON.parse(event.data));
+    source.addEventListener('done', () => {
+        source.close();
+        document.getElementById('discovery-status').style.display = 'none';
+    });
+    source.onerror = () => {
+        source.close();
+        document.getElementById('discovery-status').style.display = 'none';
+    };
+} else {
+    document.getElementById('discovery-status').style.display = 'none';
+}
+
+// Action lancée depuis la page : recharger la page quand elle est terminée
+const pendingJob = document.getElementById('pending-job');
+
+if (pendingJob) followTask(pendingJob.dataset.taskId, () => {}, () => window.location.reload());
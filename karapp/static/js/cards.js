@@ -0,0 +1,66 @@
+/**
+ * Chargement progressif des cartes de /categorie/<nom>
+ * - les miniatures ne sont chargées que lorsque la carte devient visible
+ * - la page suivante est ajoutée quand on arrive en bas de la liste
+ */
+
+const cardList = document.querySelector('.cardlist');
+
+function showArtwork(card) {
+    card.style.backgroundImage = `url('${card.dataset.artwork}')`;
+    delete card.dataset.artwork;
+}
+
+const artworkObserver = 'IntersectionObserver' in window
+    ? new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                artworkObserver.unobserve(entry.target);
+                showArtwork(entry.target);
+            }
+        });
+    }, { rootMargin: '200px' })
+    : null;
+
+function observeCards(root) {
+    root.querySelectorAll('[data-artwork]').forEach(card => {
+        if (artworkObserver) {
+            artworkObserver.observe(card);
+        } else {
+            showArtwork(card);
+        }
+    });
+    const sentinel = root.querySelector('.page-sentinel');
+    if (sentinel) {
+        if (pageObserver) {
+            pageObserver.observe(sentinel);
+        } else {
+            loadNextPage(sentinel);
+        }
+    }
+}
+
+async function loadNextPage(sentinel) {
+    const response = await fetch(sentinel.dataset.nextUrl, {
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    });
+    if (!response.ok) return;
+
+    const page = document.createElement('div');
+    page.innerHTML = await response.text();
+    sentinel.replaceWith(...page.childNodes);
+    observeCards(cardList);
+}
+
+const pageObserver = 'IntersectionObserver' in window
+    ? new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                pageObserver.unobserve(entry.target);
+                loadNextPage(entry.target);
+            }
+        });
+    }, { rootMargin: '400px' })
+    : null;
+
+observeCards(cardList);
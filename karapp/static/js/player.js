@@ -21,25 +21,14 @@ document.addEventListener('DOMContentLoaded', function() {
 
     console.log('Player.js: Audio player trouvé');
 
-    // Récupérer toutes les pistes de musique
-    const musicCards = document.querySelectorAll('.file');
-    console.log('Player.js: Nombre de pistes trouvées:', musicCards.length);
-
-    tracks = Array.from(musicCards).map(card => ({
-        url: card.dataset.trackUrl,
-        title: card.dataset.trackTitle,
-        artist: card.dataset.trackArtist,
-        artwork: card.dataset.trackArtwork
-    }));
-
-    console.log('Player.js: Tracks chargées:', tracks);
-
-    // Ajouter les event listeners pour ouvrir le modal
-    musicCards.forEach((card, index) => {
-        card.addEventListener('click', () => {
-            console.log('Click sur la piste:', index);
-            openPlayer(index);
-        });
+    // Ouvrir le modal au clic sur une piste (y compris celles ajoutées par le défilement)
+    document.querySelector('.cardlist').addEventListener('click', function(e) {
+        const card = e.target.closest('.file');
+        if (!card) return;
+        const musicCards = loadTracks();
+        const index = musicCards.indexOf(card);
+        console.log('Click sur la piste:', index);
+        openPlayer(index);
     });
 
     // Event listeners pour les contrôles du lecteur
@@ -66,6 +55,18 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// Récupérer toutes les pistes de musique affichées
+function loadTracks() {
+    const musicCards = Array.from(document.querySelectorAll('.file'));
+    tracks = musicCards.map(card => ({
+        url: card.dataset.trackUrl,
+        title: card.dataset.trackTitle,
+        artist: card.dataset.trackArtist,
+        artwork: card.dataset.trackArtwork
+    }));
+    return musicCards;
+}
+
 // Ouvrir le lecteur avec une piste spécifique
 function openPlayer(index) {
     console.log('openPlayer appelé avec index:', index);
@@ -116,7 +117,7 @@ function loadTrack(index) {
     // Afficher l'artwork si disponible
     const artworkDiv = document.getElementById('trackArtwork');
     if (track.artwork) {
-        artworkDiv.style.backgroundImage = `url('data:image/jpeg;base64,${track.artwork}')`;
+        artworkDiv.style.backgroundImage = `url('${track.artwork}')`;
     } else {
         artworkDiv.style.backgroundImage = 'none';
         artworkDiv.style.backgroundColor = '#f3d2c1';
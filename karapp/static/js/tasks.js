@@ -0,0 +1,28 @@
+/**
+ * Suivi d'une tâche de fond (synchronisation, téléchargement, action Bluetooth)
+ * La progression est envoyée par le serveur sur /tasks/<id>/events (Server-Sent Events).
+ */
+
+function followTask(taskId, onUpdate, onEnd) {
+    const source = new EventSource(`/tasks/${taskId}/events`);
+    source.onmessage = event => {
+        const task = JSON.parse(event.data);
+        onUpdate(task);
+        if (task.status !== 'running') {
+            source.close();
+            if (onEnd) onEnd(task);
+        }
+    };
+    // tâche inconnue ou déjà oubliée
+    source.addEventListener('gone', () => {
+        source.close();
+        if (onEnd) onEnd(null);
+    });
+    return source;
+}
+
+function formatEta(seconds) {
+    if (seconds === null || seconds === undefined) return '';
+    if (seconds < 60) return `${seconds} s restantes`;
+    return `${Math.round(seconds / 60)} min restantes`;
+}
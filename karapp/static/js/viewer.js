@@ -1,24 +1,35 @@
 let photos = [];
 let currentPhotoIndex = 0;
 
-// Récupérer toutes les photos
-document.addEventListener('DOMContentLoaded', function() {
-    const thumbnails = document.querySelectorAll('.file');
-    photos = Array.from(thumbnails).map(thumb => thumb.dataset.photoUrl);
-
-    // Ajouter les event listeners
-    thumbnails.forEach((thumbnail, index) => {
-        thumbnail.addEventListener('click', () => openModal(index));
-    });
+// Ouvrir une photo (y compris celles ajoutées par le défilement)
+document.querySelector('.cardlist').addEventListener('click', function(e) {
+    const thumbnail = e.target.closest('.file');
+    if (!thumbnail) return;
+    // Récupérer toutes les photos affichées
+    const thumbnails = Array.from(document.querySelectorAll('.file'));
+    photos = thumbnails.map(thumb => ({
+        preview: thumb.dataset.photoPreview,
+        url: thumb.dataset.photoUrl
+    }));
+    openModal(thumbnails.indexOf(thumbnail));
 });
 
 function openModal(index) {
     currentPhotoIndex = index;
     const modal = document.getElementById('photoModal');
-    const modalImg = document.getElementById('modalImage');
-
     modal.style.display = 'block';
-    modalImg.src = photos[currentPhotoIndex];
+    showPhoto();
+}
+
+// Affiche la miniature plein écran, ou l'original si elle n'existe pas encore
+function showPhoto() {
+    const modalImg = document.getElementById('modalImage');
+    const photo = photos[currentPhotoIndex];
+    modalImg.onerror = function() {
+        modalImg.onerror = null;
+        modalImg.src = photo.url;
+    };
+    modalImg.src = photo.preview || photo.url;
 }
 
 function closeModal() {
@@ -27,12 +38,12 @@ function closeModal() {
 
 function nextPhoto() {
     currentPhotoIndex = (currentPhotoIndex + 1) % photos.length;
-    document.getElementById('modalImage').src = photos[currentPhotoIndex];
+    showPhoto();
 }
 
 function prevPhoto() {
     currentPhotoIndex = (currentPhotoIndex - 1 + photos.length) % photos.length;
-    document.getElementById('modalImage').src = photos[currentPhotoIndex];
+    showPhoto();
 }
 
 // Event listeners pour le modal
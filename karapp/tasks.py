@@ -0,0 +1,159 @@
+"""
+Registre des tâches de fond (synchronisation, téléchargements, actions Bluetooth)
+
+Chaque tâche a un état (running, done, error, cancelled), une progression en %,
+les octets transférés, une estimation du temps restant et ses erreurs. Les
+tâches terminées sont oubliées après TASK_TTL secondes et le registre garde au
+plus MAX_TASKS tâches : la mémoire reste bornée sur un appareil allumé pendant
+des mois. Les changements sont envoyés au navigateur en Server-Sent Events
+(voir event_stream).
+"""
+import json
+import threading
+import time
+import uuid
+
+# durée de conservation d'une tâche terminée en secondes
+TASK_TTL = 3600
+MAX_TASKS = 200
+# intervalle minimal entre deux événements envoyés pour une tâche
+EVENT_INTERVAL = 0.25
+RUNNING = 'running'
+
+
+class TaskRegistry:
+    """Tâches de fond, consultables par leur identifiant"""
+
+    def __init__(self, ttl=TASK_TTL, max_tasks=MAX_TASKS):
+        """
+        Args:
+            ttl: Durée de conservation d'une tâche terminée en secondes
+            max_tasks: Nombre maximal de tâches conservées
+        """
+        self.ttl = ttl
+        self.max_tasks = max_tasks
+        self._tasks = {}  # id -> tâche, dans l'ordre de création
+        self._cond = threading.Condition()
+
+    def create(self, kind, **fields):
+        """
+        Enregistre une nouvelle tâche
+
+        Args:
+            kind: Type de tâche (sync, download, bluetooth...)
+            fields: Champs propres à la tâche
+
+        Returns:
+            Identifiant de la tâche
+        """
+        task_id = str(uuid.uuid4())
+        now = time.time()
+        task = {'id': task_id, 'kind': kind, 'status': RUNNING, 'progress': 0, 'bytes': 0,
+                'eta': None, 'errors': [], 'message': None, 'started': now, 'updated': now,
+                'version': 0, **fields}
+        with self._cond:
+            self._evict(now)
+            self._tasks[task_id] = task
+        return task_id
+
+    def get(self, task_id):
+        """Copie de l'état d'une tâche, None si elle est inconnue ou oubliée"""
+        with self._cond:
+            return self._snapshot(task_id)
+
+    def update(self, task_id, **fields):
+        """Met à jour une tâche et recalcule le temps restant"""
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            task.update(fields)
+            now = time.time()
+            progress = task['progress']
+            if task['status'] == RUNNING and 0 < progress < 100:
+                task['eta'] = round((now - task['started']) * (100 - progress) / progress)
+            else:
+                task['eta'] = None
+            self._touch(task, now)
+
+    def add_error(self, task_id, message):
+        """Ajoute une erreur à une tâche qui continue"""
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task['errors'].append(message)
+                self._touch(task, time.time())
+
+    def finish(self, task_id, status='done', **fields):
+        """Termine une tâche (done, error ou cancelled)"""
+        self.update(task_id, status=status, progress=100, **fields)
+
+    def wait(self, task_id, version=-1, timeout=15):
+        """
+        Attend qu'une tâche change
+
+        Args:
+            task_id: Identifiant de la tâche
+            version: Dernière version connue de la tâche
+            timeout: Délai maximal d'attente en secondes
+
+        Returns:
+            Copie de l'état de la tâche (éventuellement inchangé), None si elle est inconnue
+        """
+        def changed():
+            task = self._tasks.get(task_id)
+            return task is None or task['version'] > version or task['status'] != RUNNING
+
+        with self._cond:
+            self._cond.wait_for(changed, timeout)
+            return self._snapshot(task_id)
+
+    def _snapshot(self, task_id):
+        task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        return {**task, 'errors': list(task['errors'])}
+
+    def _touch(self, task, now):
+        task['updated'] = now
+        task['version'] += 1
+        self._cond.notify_all()
+
+    def _evict(self, now):
+        """Oublie les tâches terminées trop anciennes, puis les plus anciennes au-delà de max_tasks"""
+        finished = [task_id for task_id, task in self._tasks.items() if task['status'] != RUNNING]
+        for task_id in finished:
+            if now - self._tasks[task_id]['updated'] > self.ttl:
+                del self._tasks[task_id]
+        for task_id in finished:
+            if len(self._tasks) < self.max_tasks:
+                break
+            self._tasks.pop(task_id, None)
+
+
+def event_stream(registry, task_id, interval=EVENT_INTERVAL):
+    """
+    Événements Server-Sent Events d'une tâche, jusqu'à sa fin
+
+    Chaque événement contient l'état complet de la tâche ; les changements
+    rapprochés (progression d'un téléchargement) sont regroupés.
+    """
+    version = -1
+    while True:
+        task = registry.wait(task_id, version)
+        if task is None:
+            yield 'event: gone\ndata: {}\n\n'
+            return
+        if task['version'] == version and task['status'] == RUNNING:
+            # garder la connexion ouverte
+            yield ': ping\n\n'
+            continue
+        version = task['version']
+        yield f'data: {json.dumps(task)}\n\n'
+        if task['status'] != RUNNING:
+            return
+        time.sleep(interval)
+
+
+# registre partagé par toute l'application
+tasks = TaskRegistry()
@@ -0,0 +1,85 @@
+"""
+Téléchargement de fichiers en flux, avec reprise
+
+Le fichier est écrit par morceaux dans <dest>.part puis renommé une fois
+complet : rien n'est gardé en mémoire et un téléchargement interrompu reprend
+là où il s'était arrêté grâce à une requête HTTP Range.
+"""
+import os
+import re
+import time
+
+CHUNK_SIZE = 64 * 1024
+
+
+def download_file(url, dest, progress=None, retries=3, timeout=30):
+    """
+    Télécharge un fichier
+
+    Args:
+        url: Adresse du fichier
+        dest: Chemin de destination
+        progress: Fonction appelée avec (octets reçus, taille totale ou None)
+        retries: Nombre de reprises après une coupure
+        timeout: Délai maximal d'attente du serveur en secondes
+
+    Returns:
+        Taille du fichier en octets
+    """
+    import requests
+
+    dest = str(dest)
+    part = dest + '.part'
+
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416 and offset:
+                    # le fichier partiel est déjà complet, sinon recommencer
+                    # depuis le début sans compter de reprise : la requête
+                    # suivante, sans Range, ne peut plus recevoir de 416
+                    if _content_range_total(response) == offset:
+                        break
+                    os.remove(part)
+                    continue
+                response.raise_for_status()
+
+                if response.status_code == 206:
+                    mode = 'ab'
+                    total = _content_range_total(response)
+                else:
+                    # le serveur ne gère pas la reprise : tout retélécharger
+                    mode, offset = 'wb', 0
+                    length = response.headers.get('Content-Length')
+                    total = int(length) if length and length.isdigit() else None
+
+                done = offset
+                with open(part, mode) as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        done += len(chunk)
+                        if progress:
+                            progress(done, total)
+
+            if total is None or done >= total:
+                break
+            # connexion fermée avant la fin : reprendre
+        except (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            print(f"Téléchargement de {url} interrompu ({e}), reprise...")
+        if attempt == retries:
+            raise requests.ConnectionError(f"Téléchargement incomplet de {url}")
+        time.sleep(min(2 ** attempt, 10))
+        attempt += 1
+
+    os.replace(part, dest)
+    return os.path.getsize(dest)
+
+
+def _content_range_total(response):
+    """Taille totale annoncée par l'en-tête Content-Range (bytes a-b/total)"""
+    match = re.search(r'/(\d+)$', response.headers.get('Content-Range', ''))
+    return int(match.group(1)) if match else None
@@ -0,0 +1,55 @@
+"""
+Détection du type MIME des fichiers de la bibliothèque
+
+Le type est lu dans les premiers octets du fichier : un épisode de podcast
+enregistré en .mp3 peut être un M4A, une photo .jpg un PNG. L'extension ne
+sert qu'en dernier recours.
+"""
+import mimetypes
+
+DEFAULT_MIMETYPE = 'application/octet-stream'
+
+# (position, signature, type MIME)
+SIGNATURES = [
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (8, b'WAVE', 'audio/wav'),
+    (8, b'WEBP', 'image/webp'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF8', 'image/gif'),
+]
+# marques des conteneurs ISO (ftyp)
+FTYP_BRANDS = {
+    b'M4A ': 'audio/mp4', b'M4B ': 'audio/mp4', b'M4P ': 'audio/mp4',
+    b'heic': 'image/heic', b'heix': 'image/heic', b'mif1': 'image/heif',
+}
+
+
+def detect_mimetype(path):
+    """
+    Type MIME d'un fichier
+
+    Args:
+        path: Chemin du fichier
+
+    Returns:
+        Type MIME, application/octet-stream s'il est inconnu
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+    except OSError:
+        head = b''
+
+    for offset, signature, mimetype in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return mimetype
+    if head[4:8] == b'ftyp':
+        return FTYP_BRANDS.get(head[8:12], 'video/mp4')
+    # trame MPEG audio sans étiquette ID3
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return 'audio/mpeg'
+
+    return mimetypes.guess_type(str(path))[0] or DEFAULT_MIMETYPE
@@ -1,7 +1,6 @@
-from mutagen import File
-import base64
-
 def get_metadata(filepath):
+    from mutagen import File
+
     try:
         audio_file = File(filepath)
         if audio_file is None:
@@ -26,8 +25,7 @@ def get_metadata(filepath):
             if 'TALB' in tags:
                 metadata['album'] = str(tags['TALB'][0])
             if 'APIC:' in tags:
-                artwork = tags['APIC:'].data
-                metadata['artwork'] = base64.b64encode(artwork).decode('utf-8')
+                metadata['artwork'] = tags['APIC:'].data
 
             # MP4/M4A
             elif '\xa9nam' in tags:
@@ -37,8 +35,7 @@ def get_metadata(filepath):
             if '\xa9alb' in tags:
                 metadata['album'] = str(tags['\xa9alb'][0])
             if 'covr' in tags:
-                artwork = tags['covr'][0]
-                metadata['artwork'] = base64.b64encode(artwork).decode('utf-8')
+                metadata['artwork'] = bytes(tags['covr'][0])
 
         return metadata
 
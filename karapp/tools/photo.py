@@ -1,25 +1,155 @@
-from PIL import Image
 import base64
 import io
-import requests
+import threading
+import time
+from collections import OrderedDict
 
+# Tailles des miniatures (côté maximal en pixels)
+THUMB_SIZES = {
+    'card': 300,  # carte de la grille, pochette du lecteur
+    'podcast': 150,  # carte de podcast
+    'viewer': 1280,  # visionneuse de photos plein écran
+}
 
-def make_artwork_base64(path, size=300, quality=60):
-    # Charge l’image
-    if 'http' in path:
-        response = requests.get(path)
-        response.raise_for_status()
-        img = Image.open(io.BytesIO(response.content))
+# Cache des images distantes (pochettes de podcasts) : url -> entrée
+IMAGE_CACHE_TTL = 3600  # secondes avant de revalider une image auprès du serveur
+IMAGE_CACHE_BYTES = 32 * 1024 * 1024
+_image_cache = OrderedDict()
+_image_cache_size = 0
+_image_cache_lock = threading.Lock()
+_url_locks = {}
+
+
+def fetch_image(url):
+    """
+    Télécharge une image distante, en cache
+
+    La plupart des flux utilisent la même image pour tous leurs épisodes : elle
+    n'est téléchargée qu'une fois, même par plusieurs threads à la fois. Après
+    IMAGE_CACHE_TTL secondes, elle est revalidée par une requête conditionnelle
+    (ETag / Last-Modified).
+
+    Returns:
+        Contenu de l'image (bytes)
+    """
+    global _image_cache_size
+    import requests
+
+    with _image_cache_lock:
+        url_lock = _url_locks.setdefault(url, threading.Lock())
+
+    # un seul téléchargement à la fois par url
+    with url_lock:
+        with _image_cache_lock:
+            cached = _image_cache.get(url)
+            if cached is not None:
+                _image_cache.move_to_end(url)
+        if cached is not None and time.monotonic() - cached['fetched'] < IMAGE_CACHE_TTL:
+            return cached['content']
+
+        headers = {}
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        try:
+            response = requests.get(url, headers=headers, timeout=30)
+            if cached is not None and response.status_code == 304:
+                content = cached['content']
+            else:
+                response.raise_for_status()
+                content = response.content
+        except Exception:
+            # le verrou d'une url jamais mise en cache n'est retiré par aucune
+            # éviction : le retirer ici pour que les échecs (404, délai) ne
+            # s'accumulent pas
+            with _image_cache_lock:
+                if url not in _image_cache and _url_locks.get(url) is url_lock:
+                    del _url_locks[url]
+            raise
+
+        with _image_cache_lock:
+            if cached is not None:
+                _image_cache_size -= len(cached['content'])
+            _image_cache[url] = {
+                'content': content,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched': time.monotonic(),
+            }
+            _image_cache_size += len(content)
+            # retirer les images les moins récemment utilisées
+            while _image_cache_size > IMAGE_CACHE_BYTES and len(_image_cache) > 1:
+                old_url, old = _image_cache.popitem(last=False)
+                _image_cache_size -= len(old['content'])
+                _url_locks.pop(old_url, None)
+        return content
+
+
+def open_image(source, max_size=None):
+    """
+    Ouvre une image à partir d'un chemin, d'une url ou de bytes
+
+    Un JPEG est décodé directement à une résolution réduite (1/2, 1/4 ou 1/8)
+    proche de max_size, et l'orientation EXIF est appliquée.
+    """
+    # PIL n'est chargé qu'à la première image (démarrage plus rapide)
+    from PIL import Image, ImageOps
+
+    if isinstance(source, bytes):
+        img = Image.open(io.BytesIO(source))
+    elif 'http' in source:
+        img = Image.open(io.BytesIO(fetch_image(source)))
     else:
-        img = Image.open(path)
+        img = Image.open(source)
+
+    if max_size and img.format == 'JPEG':
+        img.draft('RGB', (max_size, max_size))
+    return ImageOps.exif_transpose(img)
+
+
+def make_artworks(source, sizes, quality=60, format='JPEG'):
+    """
+    Crée plusieurs miniatures d'une image en un seul décodage
+
+    Args:
+        source: Chemin, url ou contenu (bytes) de l'image
+        sizes: Tailles maximales des miniatures
+        quality: Qualité de compression
+        format: JPEG ou WEBP
 
-    # Resize pour réduire fortement le poids
-    img.thumbnail((size, size))
+    Returns:
+        Dictionnaire taille -> contenu de la miniature (bytes)
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    img = open_image(source, sizes[0])
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
 
-    # Sauvegarde dans un buffer mémoire
-    buffer = io.BytesIO()
-    img.save(buffer, format="JPEG", quality=quality, optimize=True)
-    artwork_bytes = buffer.getvalue()
+    artworks = {}
+    # de la plus grande à la plus petite, chaque réduction repart de la précédente
+    for size in sizes:
+        img.thumbnail((size, size), reducing_gap=2.0)
+        buffer = io.BytesIO()
+        if format == 'WEBP':
+            img.save(buffer, format='WEBP', quality=quality, method=4)
+        else:
+            img.save(buffer, format='JPEG', quality=quality, optimize=True)
+        artworks[size] = buffer.getvalue()
+    return artworks
 
+
+def make_artwork(source, size=300, quality=60, format='JPEG'):
+    """
+    Crée une miniature à partir d'un chemin, d'une url ou de bytes
+
+    Returns:
+        Contenu de la miniature (bytes)
+    """
+    return make_artworks(source, [size], quality, format)[size]
+
+
+def make_artwork_base64(path, size=300, quality=60):
     # Encodage Base64 UTF-8
-    return base64.b64encode(artwork_bytes).decode('utf-8')
\ No newline at end of file
+    return base64.b64encode(make_artwork(path, size, quality)).decode('utf-8')
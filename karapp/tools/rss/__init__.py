@@ -1,44 +1,207 @@
-import pkgutil
-import importlib
-import inspect
-import feedparser
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from importlib.metadata import EntryPoint, entry_points
 
 from karapp.tools.rss.base import RssSearchTool
 
-# Charger dynamiquement tous les modules du package rss
-__all__ = ['get_tool_by_name', 'list_tools']
+__all__ = ['get_tool_by_name', 'list_tools', 'search', 'get_feed', 'get_infos', 'get_episodes_list']
+
+# Outils de recherche fournis avec Karadoc (nom -> module:classe). D'autres
+# paquets peuvent en ajouter via le groupe d'entry points ENTRY_POINT_GROUP.
+BUILTIN_TOOLS = {
+    'My Podcast Data': 'karapp.tools.rss.mpdsearch:MpdSearchTool',
+    'Radio France': 'karapp.tools.rss.rfsearch:RadioFranceSearchTool',
+}
+ENTRY_POINT_GROUP = 'karadoc.rss_tools'
+
+# Registre construit une seule fois : nom -> EntryPoint ou classe déjà importée
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            registry = {name: EntryPoint(name, value, ENTRY_POINT_GROUP)
+                        for name, value in BUILTIN_TOOLS.items()}
+            for ep in entry_points(group=ENTRY_POINT_GROUP):
+                registry.setdefault(ep.name, ep)
+            _registry = registry
+        return _registry
+
 
 def get_tool_by_name(name: str):
     """
-    Retourne la classe dont self.name == name
-    """
-    # Parcourir tous les sous-modules du package
-    for loader, module_name, is_pkg in pkgutil.iter_modules(__path__):
-        module = importlib.import_module(f"{__name__}.{module_name}")
+    Retourne la classe de l'outil de recherche enregistré sous ce nom
 
-        # Chercher les classes qui héritent de RssSearchTool
-        for _, obj in inspect.getmembers(module, inspect.isclass):
-            if issubclass(obj, RssSearchTool) and obj is not RssSearchTool:
-                instance = obj()
-                if instance.name == name:
-                    return obj
+    Le module de l'outil n'est importé qu'à sa première utilisation.
+    """
+    registry = _get_registry()
+    tool = registry.get(name)
+    if tool is None:
+        raise ValueError(f"Aucune classe trouvée avec name='{name}'")
 
-    raise ValueError(f"Aucune classe trouvée avec name='{name}'")
+    if isinstance(tool, EntryPoint):
+        cls = tool.load()
+        if not (isinstance(cls, type) and issubclass(cls, RssSearchTool)):
+            raise ValueError(f"{tool.value} n'est pas un RssSearchTool")
+        with _registry_lock:
+            registry[name] = cls
+        return cls
+    return tool
 
 
 def list_tools():
-    tools = []
-    for loader, module_name, is_pkg in pkgutil.iter_modules(__path__):
-        module = importlib.import_module(f"{__name__}.{module_name}")
-        for _, obj in inspect.getmembers(module, inspect.isclass):
-            if issubclass(obj, RssSearchTool) and obj is not RssSearchTool:
-                instance = obj()
-                tools.append(instance.name)
-    return tools
+    """Noms des outils de recherche disponibles (sans importer leurs modules)"""
+    return list(_get_registry())
+
+
+# Recherches en parallèle : (outil, requête normalisée) -> (résultats, date)
+SEARCH_TIMEOUT = 8  # secondes d'attente maximale de chaque outil
+SEARCH_TTL = 600
+SEARCH_CACHE_SIZE = 64
+_search_cache = OrderedDict()
+_search_lock = threading.Lock()
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='rss-search')
+
+
+def normalize_query(keyword):
+    """Requête sans différence de casse ni d'espaces, utilisée comme clé de cache"""
+    return ' '.join(keyword.casefold().split())
+
+
+def _cached_search(name, query):
+    with _search_lock:
+        cached = _search_cache.get((name, query))
+        if cached is not None and time.monotonic() - cached[1] < SEARCH_TTL:
+            _search_cache.move_to_end((name, query))
+            return cached[0]
+    return None
+
+
+def _run_search(name, query, keyword):
+    # la requête normalisée ne sert qu'au cache, l'outil reçoit le texte saisi
+    results = get_tool_by_name(name).search(keyword)
+    with _search_lock:
+        _search_cache[(name, query)] = (results, time.monotonic())
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    return results
+
+
+def search(keyword, names=None, timeout=SEARCH_TIMEOUT):
+    """
+    Recherche un podcast auprès de plusieurs outils en parallèle
+
+    Les résultats de chaque outil sont gardés en cache SEARCH_TTL secondes. Un
+    outil qui ne répond pas dans le délai est ignoré pour cette recherche, mais
+    sa réponse tardive remplit le cache pour la suivante.
+
+    Args:
+        keyword: Texte recherché
+        names: Noms des outils à interroger (tous par défaut)
+        timeout: Délai d'attente maximal en secondes
+
+    Returns:
+        Liste de résultats, sans doublon de flux RSS
+    """
+    query = normalize_query(keyword)
+    names = list_tools() if names is None else names
+    results = {}
+    futures = {}
+    for name in names:
+        cached = _cached_search(name, query)
+        if cached is not None:
+            results[name] = cached
+        else:
+            futures[_search_executor.submit(_run_search, name, query, keyword)] = name
+
+    if futures:
+        done, _ = wait(futures, timeout=timeout)
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                print(f"Erreur de recherche avec {futures[future]}: {e}")
+
+    # fusion dans l'ordre des outils, dédoublonnée par flux RSS
+    merged = []
+    seen = set()
+    for name in names:
+        for result in results.get(name) or []:
+            key = (result.get('flux_rss') or '').strip().rstrip('/')
+            if key:
+                if key in seen:
+                    continue
+                seen.add(key)
+            merged.append(result)
+    return merged
+
+
+# Cache des flux parsés : url -> (flux, date de récupération)
+FEED_TTL = 300  # secondes pendant lesquelles le flux est réutilisé sans requête
+FEED_CACHE_SIZE = 32
+_feed_cache = OrderedDict()
+_feed_lock = threading.Lock()
+
+
+def _feed_ok(feed):
+    """Vrai si le flux a été récupéré correctement (réponse 2xx ou fichier local lisible)"""
+    status = feed.get('status')
+    if status is not None and not 200 <= status < 300:
+        return False
+    if status is None or feed.get('bozo'):
+        # pas de réponse HTTP ou document illisible : seul un flux avec des épisodes compte
+        return bool(feed.entries)
+    return True
+
+
+def get_feed(url):
+    """
+    Récupère et parse un flux RSS, en cache
+
+    Un flux récupéré depuis moins de FEED_TTL secondes est réutilisé tel quel ;
+    au-delà il est revalidé par une requête conditionnelle (ETag /
+    Last-Modified) et n'est parsé à nouveau que s'il a changé. Une erreur
+    (statut HTTP hors 2xx/304, document illisible sans épisode) ne remplace
+    pas le flux en cache, qui est renvoyé à la place. Les flux les moins
+    récemment utilisés sont retirés au-delà de FEED_CACHE_SIZE.
+    """
+    with _feed_lock:
+        cached = _feed_cache.get(url)
+        if cached is not None:
+            _feed_cache.move_to_end(url)
+            if time.monotonic() - cached[1] < FEED_TTL:
+                return cached[0]
+
+    import feedparser
+
+    if cached is not None:
+        feed = feedparser.parse(url, etag=cached[0].get('etag'), modified=cached[0].get('modified'))
+    else:
+        feed = feedparser.parse(url)
+
+    status = feed.get('status')
+    if status == 304 and cached is not None:
+        feed = cached[0]
+    elif not _feed_ok(feed):
+        # un flux qui n'a pas pu être récupéré ne remplace pas la dernière
+        # version valide : elle reste servie jusqu'à la prochaine revalidation
+        return cached[0] if cached is not None else feed
+
+    with _feed_lock:
+        _feed_cache[url] = (feed, time.monotonic())
+        _feed_cache.move_to_end(url)
+        while len(_feed_cache) > FEED_CACHE_SIZE:
+            _feed_cache.popitem(last=False)
+    return feed
 
 
 def get_infos(url):
-    feed = feedparser.parse(url)
+    feed = get_feed(url)
     return {
         'titre': feed.feed.get('title', 'Sans titre'),
         'description': feed.feed.get('subtitle', ''),
@@ -46,8 +209,9 @@ def get_infos(url):
     }
 
 def get_episodes_list(url):
-    feed = feedparser.parse(url)
+    feed = get_feed(url)
     return [
         {'titre': e.title, 'audio': e.enclosures[0].href if e.enclosures else None,
-         'image': e.image.href if e.image else None, 'description': e.summary if e.summary else ''}
+         'image': e.image.href if e.image else None, 'description': e.summary if e.summary else '',
+         'guid': e.get('id') or (e.enclosures[0].href if e.enclosures else e.title)}
         for e in feed.entries]
\ No newline at end of file
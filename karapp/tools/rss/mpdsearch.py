@@ -1,9 +1,67 @@
+import os
+import re
+import sqlite3
+import threading
+import time
 import requests
 import json
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 
 from karapp.tools.rss.base import RssSearchTool
 
+# Résolutions simultanées des pages Apple Podcasts
+APPLE_WORKERS = 6
+FEED_URL_RE = re.compile(r'"feedUrl"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# durée de validité d'un flux trouvé sur Apple Podcasts (un podcast peut changer d'hébergeur)
+FEED_TTL = 30 * 24 * 3600
+
+
+class FeedUrlCache:
+    """Cache persistant (SQLite) des flux RSS trouvés sur les pages Apple Podcasts"""
+
+    def __init__(self, path, ttl=FEED_TTL):
+        """
+        Args:
+            path: Fichier SQLite du cache
+            ttl: Durée de validité d'un flux en secondes
+        """
+        self.path = path
+        self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS apple_feeds ('
+                               'apple_url TEXT PRIMARY KEY, feed_url TEXT NOT NULL, updated REAL NOT NULL)')
+        return self._conn
+
+    def get_many(self, apple_urls):
+        """Renvoie les flux connus : apple_url -> feed_url (les flux périmés sont absents)"""
+        apple_urls = list(apple_urls)
+        if not apple_urls:
+            return {}
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT apple_url, feed_url FROM apple_feeds WHERE updated >= ? AND apple_url IN (%s)'
+                % ','.join('?' * len(apple_urls)), [time.time() - self.ttl, *apple_urls]).fetchall()
+        return dict(rows)
+
+    def put_many(self, feeds):
+        """Enregistre des flux : apple_url -> feed_url"""
+        if not feeds:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany('INSERT OR REPLACE INTO apple_feeds VALUES (?, ?, ?)',
+                             [(apple_url, feed_url, now) for apple_url, feed_url in feeds.items()])
+            conn.commit()
+
+
+feed_cache = FeedUrlCache(os.path.join(os.getenv('DB_PATH') or '.', 'rss_cache.db'))
+
 
 class MpdSearchTool(RssSearchTool):
 
@@ -21,8 +79,13 @@ class MpdSearchTool(RssSearchTool):
         response = requests.get(url, headers=headers)
         response.raise_for_status()
         data = json.loads(response.text)
-        resultats = []
 
+        # flux à retrouver sur les pages Apple Podcasts, résolus ensemble
+        apple_urls = [item['apple']['appleUrl'] for item in data['shows']
+                      if not item.get("rssSource") and 'apple' in item]
+        apple_feeds = cls.resolve_apple_podcasts(apple_urls)
+
+        resultats = []
         for item in data['shows']:
             titre = item.get("title")
             url_page = item.get("link")
@@ -30,8 +93,7 @@ class MpdSearchTool(RssSearchTool):
             image = item.get("logo")
             flux_rss = item.get("rssSource", None)
             if not flux_rss and 'apple' in item:
-                # flux_rss = get_rss_from_apple_podcast(item['apple']['appleUrl'])
-                flux_rss = cls.get_rss_from_apple_podcast(item['apple']['appleUrl'])
+                flux_rss = apple_feeds.get(item['apple']['appleUrl'])
             resultats.append({
                 "titre": titre,
                 "url_page": url_page,
@@ -41,6 +103,35 @@ class MpdSearchTool(RssSearchTool):
             })
         return resultats
 
+    @classmethod
+    def resolve_apple_podcasts(cls, apple_urls):
+        """
+        Retrouve les flux RSS de plusieurs pages Apple Podcasts
+
+        Les flux déjà connus viennent du cache persistant, les autres pages
+        sont chargées en parallèle.
+
+        Returns:
+            Dictionnaire apple_url -> feed_url (pages sans flux absentes)
+        """
+        feeds = feed_cache.get_many(set(apple_urls))
+        missing = [u for u in dict.fromkeys(apple_urls) if u not in feeds]
+        if not missing:
+            return feeds
+
+        def resolve(apple_url):
+            try:
+                return apple_url, cls.get_rss_from_apple_podcast(apple_url)
+            except Exception as e:
+                print(f"Flux RSS introuvable pour {apple_url}: {e}")
+                return apple_url, None
+
+        with ThreadPoolExecutor(max_workers=min(APPLE_WORKERS, len(missing))) as executor:
+            found = {u: feed for u, feed in executor.map(resolve, missing) if feed}
+        feed_cache.put_many(found)
+        feeds.update(found)
+        return feeds
+
     @staticmethod
     def get_rss_from_apple_podcast(url: str) -> str:
         """
@@ -49,6 +140,13 @@ class MpdSearchTool(RssSearchTool):
         headers = {"User-Agent": "Mozilla/5.0"}
         response = requests.get(url, headers=headers, timeout=10)
         response.raise_for_status()
+
+        # Recherche directe de la clé feedUrl dans le JSON embarqué, sans parser le HTML
+        match = FEED_URL_RE.search(response.text)
+        if match:
+            return json.loads(f'"{match.group(1)}"')
+
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.text, "html.parser")
 
         # Apple Podcasts met le flux RSS dans une balise <script> JSON-LD
@@ -73,4 +171,4 @@ def find_keys(obj, key):
     elif isinstance(obj, list):
         for item in obj:
             results.extend(find_keys(item, key))
-    return results
\ No newline at end of file
+    return results
@@ -0,0 +1,152 @@
+"""
+Stockage des miniatures sur disque, une seule fois par contenu
+
+Chaque miniature est identifiée par le hash SHA-1 de son contenu : la même
+pochette d'album partagée par toutes les pistes n'est enregistrée qu'une fois.
+Des variantes d'autres tailles (clés de THUMB_SIZES) peuvent être enregistrées
+à côté de la miniature, sous le même hash.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from karapp.tools.photo import THUMB_SIZES, fetch_image, make_artworks
+
+DIGEST_RE = re.compile(r'[0-9a-f]{40}')
+MIMETYPES = {'.jpg': 'image/jpeg', '.webp': 'image/webp'}
+# miniatures déjà créées : (hash de l'image source, tailles) -> hash de la miniature
+SOURCE_MEMO_SIZE = 1024
+
+
+def _suffix(data):
+    """Extension d'une miniature d'après son contenu"""
+    return '.webp' if data[:4] == b'RIFF' and data[8:12] == b'WEBP' else '.jpg'
+
+
+class ThumbnailStore:
+    """Miniatures adressées par le hash de leur contenu"""
+
+    def __init__(self, root, format='JPEG'):
+        """
+        Args:
+            root: Dossier des miniatures
+            format: Format des nouvelles miniatures (JPEG ou WEBP)
+        """
+        self.root = Path(root)
+        self.format = format
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    def __getstate__(self):
+        # le mémo n'est pas transmis aux processus d'extraction
+        return {'root': self.root, 'format': self.format}
+
+    def __setstate__(self, state):
+        self.__init__(state['root'], state['format'])
+
+    def path_for(self, digest, variant=None, suffix='.jpg'):
+        """Chemin du fichier d'une miniature ou d'une de ses variantes"""
+        name = f'{digest}_{variant}' if variant else digest
+        return self.root / digest[:2] / f'{name}{suffix}'
+
+    def find(self, digest, variant=None):
+        """
+        Cherche le fichier d'une miniature
+
+        Args:
+            digest: Hash de la miniature
+            variant: Nom de la variante (clé de THUMB_SIZES), None pour la miniature
+
+        Returns:
+            Chemin du fichier, None si la miniature n'existe pas
+        """
+        if not digest or DIGEST_RE.fullmatch(digest) is None:
+            return None
+        if variant is not None and variant not in THUMB_SIZES:
+            return None
+        for suffix in MIMETYPES:
+            path = self.path_for(digest, variant, suffix)
+            if path.is_file():
+                return path
+        return None
+
+    def exists(self, digest, variant=None):
+        return self.find(digest, variant) is not None
+
+    @staticmethod
+    def mimetype(path):
+        return MIMETYPES[Path(path).suffix]
+
+    def _write(self, path, data):
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # écriture atomique : plusieurs processus peuvent écrire la même miniature
+            tmp = path.with_name(f'{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+    def put(self, data, variants=None):
+        """
+        Enregistre une miniature
+
+        Args:
+            data: Contenu JPEG ou WebP de la miniature
+            variants: Variantes de la même image (nom -> contenu)
+
+        Returns:
+            Hash de la miniature
+        """
+        digest = hashlib.sha1(data).hexdigest()
+        self._write(self.path_for(digest, suffix=_suffix(data)), data)
+        for variant, variant_data in (variants or {}).items():
+            self._write(self.path_for(digest, variant, _suffix(variant_data)), variant_data)
+        return digest
+
+    def put_artwork(self, source, size=THUMB_SIZES['card'], variants=()):
+        """
+        Crée et enregistre la miniature d'une image
+
+        La miniature et ses variantes sont produites à partir d'un seul décodage.
+
+        Args:
+            source: Chemin, url ou contenu (bytes) de l'image
+            size: Taille maximale de la miniature
+            variants: Noms (clés de THUMB_SIZES) des variantes à créer aussi
+
+        Returns:
+            Hash de la miniature, None si l'image n'a pas pu être lue
+        """
+        if not source:
+            return None
+        try:
+            data = source
+            if isinstance(source, str) and 'http' in source:
+                data = fetch_image(source)
+            if not isinstance(data, bytes):
+                return self._put_artworks(data, size, variants)
+
+            # une même image (pochette partagée par tous les épisodes d'un flux,
+            # d'un album) n'est réduite qu'une fois
+            key = (hashlib.sha1(data).hexdigest(), size, tuple(variants))
+            with self._memo_lock:
+                digest = self._memo.get(key)
+            if digest is None or not self.exists(digest):
+                digest = self._put_artworks(data, size, variants)
+                with self._memo_lock:
+                    self._memo[key] = digest
+                    while len(self._memo) > SOURCE_MEMO_SIZE:
+                        self._memo.popitem(last=False)
+            return digest
+        except Exception as e:
+            name = source if isinstance(source, str) else 'image intégrée'
+            print(f"Erreur lors de la création de la miniature de {name}: {e}")
+            return None
+
+    def _put_artworks(self, source, size, variants):
+        sizes = [size] + [THUMB_SIZES[variant] for variant in variants]
+        artworks = make_artworks(source, sizes, format=self.format)
+        return self.put(artworks[size],
+                        {variant: artworks[THUMB_SIZES[variant]] for variant in variants})
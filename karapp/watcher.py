@@ -0,0 +1,117 @@
+"""
+Surveillance de la bibliothèque avec inotify
+
+Les événements sont regroupés (debounce) puis seuls les chemins concernés sont
+synchronisés avec la table files : une musique copiée sur l'appareil apparaît
+sans relancer une synchronisation complète.
+Nécessite le paquet optionnel inotify_simple.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+from karapp.library import SYNC_CATEGORIES, SYNC_LOCK, sync_paths
+
+
+class LibraryWatcher(threading.Thread):
+    """Thread qui maintient la table files à jour à partir des événements inotify"""
+
+    def __init__(self, app, data_path, thumbs, workers=1, debounce=2.0, max_delay=30.0):
+        """
+        Args:
+            app: Application Flask (pour le contexte de la base)
+            data_path: Dossier racine de la bibliothèque
+            thumbs: ThumbnailStore où enregistrer les miniatures
+            workers: Nombre de processus pour l'extraction des métadonnées
+            debounce: Délai sans événement avant d'appliquer les changements
+            max_delay: Délai maximal avant d'appliquer les changements
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.app = app
+        self.data_path = data_path
+        self.thumbs = thumbs
+        self.workers = workers
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._stop_event = threading.Event()
+        self._watches = {}  # wd -> chemin du dossier surveillé
+
+    def run(self):
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            print("inotify_simple non disponible, surveillance de la bibliothèque désactivée")
+            return
+
+        self.flags = flags
+        self.mask = (flags.CREATE | flags.CLOSE_WRITE | flags.DELETE | flags.MOVED_FROM
+                     | flags.MOVED_TO | flags.DELETE_SELF | flags.ATTRIB)
+        self.inotify = INotify()
+        for category in SYNC_CATEGORIES:
+            self._watch_tree(Path(self.data_path) / category)
+        print(f'Surveillance de la bibliothèque ({len(self._watches)} dossiers)')
+
+        pending = set()
+        first_event = last_event = None
+        while not self._stop_event.is_set():
+            events = self.inotify.read(timeout=500)
+            now = time.monotonic()
+            for event in events:
+                path = self._handle_event(event)
+                if path:
+                    pending.add(path)
+                    last_event = now
+                    first_event = first_event or now
+
+            if pending and (now - last_event >= self.debounce or now - first_event >= self.max_delay):
+                self._apply(pending)
+                pending = set()
+                first_event = last_event = None
+
+        self.inotify.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _watch_tree(self, root):
+        """Surveille un dossier et tous ses sous-dossiers"""
+        for dirpath, _, _ in os.walk(root):
+            try:
+                wd = self.inotify.add_watch(dirpath, self.mask)
+                self._watches[wd] = dirpath
+            except OSError as e:
+                print(f"Impossible de surveiller {dirpath}: {e}")
+
+    def _handle_event(self, event):
+        """
+        Met à jour les surveillances et renvoie le chemin concerné par un événement
+        """
+        flags = self.flags
+        directory = self._watches.get(event.wd)
+        if event.mask & flags.IGNORED:
+            self._watches.pop(event.wd, None)
+            return None
+        if directory is None:
+            return None
+        if not event.name:
+            # événement sur le dossier surveillé lui-même (DELETE_SELF)
+            return directory if event.mask & flags.DELETE_SELF else None
+
+        path = os.path.join(directory, event.name)
+        if event.mask & flags.ISDIR:
+            if event.mask & (flags.CREATE | flags.MOVED_TO):
+                self._watch_tree(path)
+        elif event.mask & flags.CREATE:
+            # fichier en cours d'écriture : attendre CLOSE_WRITE
+            return None
+        return path
+
+    def _apply(self, paths):
+        """Synchronise les chemins modifiés"""
+        try:
+            with self.app.app_context(), SYNC_LOCK:
+                stats = sync_paths(self.data_path, paths, self.thumbs, workers=self.workers)
+            print(f'Bibliothèque mise à jour: {stats}')
+        except Exception as e:
+            print(f"Erreur lors de la mise à jour de la bibliothèque: {e}")
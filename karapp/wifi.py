@@ -1,12 +1,20 @@
 from flask import Blueprint, render_template, request, redirect, url_for
-import nmcli
 import subprocess
+import threading
+import time
 
 connection_bp = Blueprint("wifi", __name__)
 
+# durée de validité de la liste des réseaux avant un nouveau scan (secondes)
+SCAN_TTL = 30
+# durée de validité du réseau actif quand nmcli monitor n'est pas disponible
+STATE_TTL = 60
+# délai de regroupement des notifications de NetworkManager
+NOTIFY_DEBOUNCE = 0.5
+
 @connection_bp.route("/wifi_settings")
 def wifi_settings():
-    networks = scan_wifi_networks()
+    networks = scan_wifi_networks(rescan=request.args.get('rescan') == '1')
     current_wifi = get_current_wifi()
     return render_template('wifi.html', networks=networks, current_wifi=current_wifi)
 
@@ -19,6 +27,8 @@ def wifi_connect():
         return redirect(url_for('wifi.wifi_settings'))
 
     success, message = connect_to_wifi(ssid, password)
+    # le réseau actif a changé (ou non) : relire l'état sans attendre la notification
+    get_wifi_state().refresh()
 
     if success:
         return redirect(url_for('wifi.wifi_settings'))
@@ -27,25 +37,159 @@ def wifi_connect():
         current_wifi = get_current_wifi()
         return render_template('wifi.html', networks=networks, current_wifi=current_wifi, error=message)
 
-def scan_wifi_networks():
-    """Scanne les réseaux WiFi disponibles (Linux/Raspberry Pi)"""
-    nmcli.disable_use_sudo()
-    ssids = nmcli.device.wifi()
-    best_wifi = {}
-    for ap in ssids:
-        ssid = ap.ssid
-        if ssid:
-            best_wifi[ssid] = max([best_wifi.get(ssid, ap), ap], key=lambda x: x.signal)
-    networks = []
-    for wifi in best_wifi.values():
-        networks.append({
-            'ssid': wifi.ssid,
-            'bssid': wifi.bssid,
-            'signal': wifi.signal,
-            'security': wifi.security,
-            'secured': wifi.security != '' and wifi.security != 'Open'
-        })
-    return sorted(networks, key=lambda x: int(x['signal']), reverse=True)
+
+class WifiState:
+    """
+    État du WiFi (réseaux visibles et réseau actif) gardé en cache
+
+    Les pages de paramètres lisent le cache. La liste des réseaux est rescannée
+    en arrière-plan quand elle a plus de SCAN_TTL secondes, et le réseau actif
+    est relu à chaque notification de NetworkManager (nmcli monitor).
+    """
+
+    def __init__(self, scan_ttl=SCAN_TTL, state_ttl=STATE_TTL):
+        self.scan_ttl = scan_ttl
+        self.state_ttl = state_ttl
+        self._networks = None
+        self._current = None
+        self._updated = 0.0  # dernière lecture de l'état (time.monotonic)
+        self._scanned = 0.0  # dernier scan des réseaux
+        self._refresh_lock = threading.Lock()  # un seul appel à nmcli à la fois
+        self._wake = threading.Event()
+        self._pending_rescan = False
+        self._stop_event = threading.Event()
+        self._monitor = None
+        self._monitoring = False
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Démarre la mise à jour en arrière-plan (une seule fois)"""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._update_loop, daemon=True).start()
+        threading.Thread(target=self._monitor_loop, daemon=True).start()
+        self.refresh_async(rescan=True)
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self._monitor is not None:
+            self._monitor.terminate()
+
+    def networks(self, rescan=False):
+        """
+        Réseaux visibles, triés par signal décroissant
+
+        Args:
+            rescan: Attendre un nouveau scan au lieu de renvoyer le cache
+        """
+        self.start()
+        if rescan or self._networks is None:
+            self.refresh(rescan=True)
+        elif time.monotonic() - self._scanned > self.scan_ttl:
+            self.refresh_async(rescan=True)
+        return self._networks or []
+
+    def current(self):
+        """SSID du réseau actif, None si aucun"""
+        self.start()
+        if not self._updated:
+            self.refresh()
+        elif not self._monitoring and time.monotonic() - self._updated > self.state_ttl:
+            self.refresh_async()
+        return self._current
+
+    def refresh(self, rescan=False):
+        """
+        Relit l'état auprès de NetworkManager
+
+        Args:
+            rescan: Lancer un scan radio, sinon lire les réseaux déjà connus de NetworkManager
+        """
+        import nmcli
+
+        with self._refresh_lock:
+            try:
+                nmcli.disable_use_sudo()
+                aps = nmcli.device.wifi(rescan=rescan)
+            except Exception as e:
+                print(f"Erreur lors de la lecture de l'état WiFi: {e}")
+                return
+            best_wifi = {}
+            current = None
+            for ap in aps:
+                if ap.in_use:
+                    current = ap.ssid
+                if ap.ssid:
+                    best_wifi[ap.ssid] = max([best_wifi.get(ap.ssid, ap), ap], key=lambda x: x.signal)
+            networks = [{
+                'ssid': wifi.ssid,
+                'bssid': wifi.bssid,
+                'signal': wifi.signal,
+                'security': wifi.security,
+                'secured': wifi.security != '' and wifi.security != 'Open'
+            } for wifi in best_wifi.values()]
+
+            self._networks = sorted(networks, key=lambda x: int(x['signal']), reverse=True)
+            self._current = current
+            self._updated = time.monotonic()
+            if rescan:
+                self._scanned = self._updated
+
+    def refresh_async(self, rescan=False):
+        """Demande une mise à jour en arrière-plan"""
+        self._pending_rescan = self._pending_rescan or rescan
+        self._wake.set()
+
+    def _update_loop(self):
+        while not self._stop_event.is_set():
+            self._wake.wait()
+            # regrouper les notifications reçues en rafale
+            time.sleep(NOTIFY_DEBOUNCE)
+            self._wake.clear()
+            rescan, self._pending_rescan = self._pending_rescan, False
+            if not self._stop_event.is_set():
+                self.refresh(rescan=rescan)
+
+    def _monitor_loop(self):
+        """Suit les changements signalés par NetworkManager"""
+        while not self._stop_event.is_set():
+            try:
+                self._monitor = subprocess.Popen(['nmcli', 'monitor'], stdout=subprocess.PIPE,
+                                                 stderr=subprocess.DEVNULL, text=True)
+            except FileNotFoundError:
+                print("nmcli non disponible, état WiFi actualisé toutes les "
+                      f"{self.state_ttl} secondes")
+                return
+            self._monitoring = True
+            # chaque ligne est un changement (connexion, déconnexion, état d'un appareil)
+            for _ in self._monitor.stdout:
+                self.refresh_async()
+            self._monitor.wait()
+            self._monitoring = False
+            # NetworkManager redémarré : relancer la surveillance
+            self._stop_event.wait(5)
+
+
+_wifi_state = None
+_wifi_state_lock = threading.Lock()
+
+
+def get_wifi_state():
+    """Service d'état WiFi partagé par toute l'application"""
+    global _wifi_state
+    with _wifi_state_lock:
+        if _wifi_state is None:
+            _wifi_state = WifiState()
+    return _wifi_state
+
+
+def scan_wifi_networks(rescan=False):
+    """Réseaux WiFi disponibles (Linux/Raspberry Pi), depuis le cache"""
+    return get_wifi_state().networks(rescan=rescan)
 
 def connect_to_wifi(ssid, password=None):
     """Se connecte à un réseau WiFi (Linux/Raspberry Pi)"""
@@ -67,14 +211,5 @@ def connect_to_wifi(ssid, password=None):
         return False, "NetworkManager non disponible"
 
 def get_current_wifi():
-    """Récupère le réseau WiFi actuellement connecté"""
-    try:
-        nmcli.disable_use_sudo()
-        ssids = nmcli.device.wifi()
-        for ssid in ssids:
-            if ssid.in_use:
-                return ssid.ssid
-    except (subprocess.TimeoutExpired, FileNotFoundError):
-        pass
-
-    return None
+    """Récupère le réseau WiFi actuellement connecté, depuis le cache"""
+    return get_wifi_state().current()
@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Application Flask avec une base SQLite vide"""
+    flask = pytest.importorskip('flask')
+    pytest.importorskip('flask_sqlalchemy')
+    from karapp.models import db
+
+    app = flask.Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(tmp_path / 'karapp.db')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
@@ -0,0 +1,107 @@
+"""Index des périphériques Bluetooth tenu à jour par les signaux D-Bus (bus factice)"""
+import time
+
+from karapp.bluetooth_manager import BluetoothManager
+from karapp.fake_dbus import FakeBus
+
+A2DP = '0000110b-0000-1000-8000-00805f9b34fb'
+HEADSET = 'AA:BB:CC:DD:EE:01'
+KEYBOARD = 'AA:BB:CC:DD:EE:02'
+
+
+def _devices(manager):
+    return {device['mac']: device for device in manager.get_devices()}
+
+
+def test_index_seeded_with_one_call():
+    bus = FakeBus()
+    bus.add_device(HEADSET, Name='Casque', UUIDs=[A2DP], Paired=True)
+    bus.add_device(KEYBOARD, Name='Clavier')
+
+    manager = BluetoothManager(bus=bus)
+    # les lectures suivantes viennent de l'index
+    manager.get_devices()
+    devices = _devices(manager)
+
+    assert bus.calls['GetManagedObjects'] == 1
+    assert set(devices) == {HEADSET, KEYBOARD}
+    assert devices[HEADSET]['name'] == 'Casque'
+    assert devices[HEADSET]['device_type'] == 'audio'
+    assert devices[HEADSET]['paired']
+
+
+def test_index_follows_signals():
+    bus = FakeBus()
+    manager = BluetoothManager(bus=bus)
+    assert manager.get_devices() == []
+
+    path = bus.add_device(HEADSET, Name='Casque')
+    assert _devices(manager)[HEADSET]['device_type'] == 'unknown'
+
+    bus.set_property(path, 'UUIDs', [A2DP])
+    bus.set_property(path, 'Connected', True)
+    device = _devices(manager)[HEADSET]
+    assert device['device_type'] == 'audio'
+    assert device['connected']
+    assert [d['mac'] for d in manager.get_connected_devices()] == [HEADSET]
+
+    bus.remove_device(path)
+    assert manager.get_devices() == []
+    assert bus.calls['GetManagedObjects'] == 1
+
+
+def test_actions_use_the_index():
+    bus = FakeBus()
+    path = bus.add_device(HEADSET, Name='Casque', UUIDs=[A2DP])
+    manager = BluetoothManager(bus=bus)
+
+    assert manager.pair_device(HEADSET.lower()) == (True, 'Appairage réussi')
+    assert manager.connect_device(HEADSET) == (True, 'Connexion réussie')
+    device = _devices(manager)[HEADSET]
+    assert device['paired'] and device['trusted'] and device['connected']
+    # déjà connecté : l'état vient de l'index, sans nouvel appel Connect
+    assert manager.connect_device(HEADSET) == (True, 'Périphérique déjà connecté')
+
+    assert manager.remove_device(HEADSET) == (True, 'Périphérique supprimé')
+    assert path not in bus.objects
+    assert manager.get_devices() == []
+
+    assert bus.calls['GetManagedObjects'] == 1
+    assert bus.calls['Pair'] == 1
+    assert bus.calls['Connect'] == 1
+
+
+def test_action_error_is_reported():
+    bus = FakeBus()
+    path = bus.add_device(HEADSET, Name='Casque')
+    bus.errors[(path, 'Pair')] = RuntimeError('AuthenticationFailed')
+    manager = BluetoothManager(bus=bus)
+
+    success, message = manager.pair_device(HEADSET)
+    assert not success
+    assert 'AuthenticationFailed' in message
+    assert manager.pair_device('00:00:00:00:00:00') == (False, 'Périphérique 00:00:00:00:00:00 non trouvé')
+
+
+def test_discovery_reports_new_devices():
+    bus = FakeBus()
+    manager = BluetoothManager(bus=bus)
+    session = manager.start_discovery(duration=5)
+    assert manager.start_discovery() is session
+    try:
+        deadline = time.monotonic() + 2
+        while not bus.objects[bus.adapter_path]['org.bluez.Adapter1']['Discovering']:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        bus.add_device(HEADSET, Name='Casque', UUIDs=[A2DP])
+        events, seq, done = session.wait_events(0, timeout=2)
+        assert [event['mac'] for event in events] == [HEADSET]
+        assert events[0]['device_type'] == 'audio'
+        assert seq == 1 and not done
+    finally:
+        session.stop()
+
+    events, seq, done = session.wait_events(seq, timeout=2)
+    assert events == [] and done
+    assert bus.calls['StopDiscovery'] == 1
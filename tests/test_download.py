@@ -0,0 +1,75 @@
+import pytest
+
+requests = pytest.importorskip('requests')
+
+from karapp.tools.download import download_file
+
+DATA = b'0123456789'
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}')
+
+    def iter_content(self, size):
+        yield self._body
+
+
+def serve(monkeypatch, data=DATA):
+    """Serveur factice gérant Range comme un vrai serveur HTTP"""
+    requested = []
+
+    def get(url, headers=None, **kwargs):
+        requested.append(dict(headers or {}))
+        range_header = (headers or {}).get('Range')
+        if not range_header:
+            return FakeResponse(200, data, {'Content-Length': str(len(data))})
+        start = int(range_header[len('bytes='):-1])
+        if start >= len(data):
+            return FakeResponse(416, headers={'Content-Range': f'bytes */{len(data)}'})
+        return FakeResponse(206, data[start:], {'Content-Range': f'bytes {start}-{len(data) - 1}/{len(data)}'})
+
+    monkeypatch.setattr(requests, 'get', get)
+    return requested
+
+
+@pytest.mark.parametrize('retries', [0, 3])
+def test_oversized_part_restarts_from_scratch(tmp_path, monkeypatch, retries):
+    requested = serve(monkeypatch)
+    dest = tmp_path / 'episode.mp3'
+    (tmp_path / 'episode.mp3.part').write_bytes(DATA + b'trop long')
+
+    assert download_file('https://example.org/e.mp3', dest, retries=retries) == len(DATA)
+    assert dest.read_bytes() == DATA
+    assert requested == [{'Range': f'bytes={len(DATA) + 9}-'}, {}]
+
+
+def test_complete_part_is_kept(tmp_path, monkeypatch):
+    serve(monkeypatch)
+    dest = tmp_path / 'episode.mp3'
+    (tmp_path / 'episode.mp3.part').write_bytes(DATA)
+
+    assert download_file('https://example.org/e.mp3', dest, retries=0) == len(DATA)
+    assert dest.read_bytes() == DATA
+
+
+def test_resume_partial_download(tmp_path, monkeypatch):
+    requested = serve(monkeypatch)
+    dest = tmp_path / 'episode.mp3'
+    (tmp_path / 'episode.mp3.part').write_bytes(DATA[:4])
+
+    download_file('https://example.org/e.mp3', dest, retries=0)
+    assert dest.read_bytes() == DATA
+    assert requested == [{'Range': 'bytes=4-'}]
@@ -0,0 +1,94 @@
+"""Synchronisation de la bibliothèque dans une base vide"""
+import os
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from karapp.library import sync_library, sync_paths
+from karapp.models import FileModel
+from karapp.tools.thumbnails import ThumbnailStore
+
+
+def _write(path, data=b'\0' * 16):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def _check_tree(data_path):
+    rows = {row.path: row for row in FileModel.query.all()}
+    for path, row in rows.items():
+        parent = os.path.dirname(path)
+        if parent in rows:
+            assert row.parent == rows[parent].id
+    return rows
+
+
+def test_sync_nested_tree_into_empty_db(app, tmp_path):
+    data_path = tmp_path / 'data'
+    _write(data_path / 'photo' / '2020' / 'vacances' / 'plage.jpg')
+    _write(data_path / 'musique' / 'Artiste' / 'Album' / 'piste.mp3')
+
+    stats = sync_library(str(data_path), ThumbnailStore(tmp_path / 'thumbs'))
+
+    rows = _check_tree(data_path)
+    assert str(data_path / 'photo' / '2020' / 'vacances') in rows
+    assert str(data_path / 'musique' / 'Artiste' / 'Album' / 'piste.mp3') in rows
+    assert stats['added'] == len(rows)
+
+
+def test_sync_paths_new_album_folder(app, tmp_path):
+    data_path = tmp_path / 'data'
+    thumbs = ThumbnailStore(tmp_path / 'thumbs')
+    _write(data_path / 'musique' / 'Artiste' / 'Ancien' / 'piste.mp3')
+    sync_library(str(data_path), thumbs)
+
+    album = data_path / 'musique' / 'Artiste' / 'Nouveau'
+    _write(album / 'CD1' / 'piste.mp3')
+    sync_paths(str(data_path), [album], thumbs)
+
+    rows = _check_tree(data_path)
+    assert rows[str(album / 'CD1' / 'piste.mp3')].parent == rows[str(album / 'CD1')].id
+    assert rows[str(album)].parent == rows[str(album.parent)].id
+
+
+def test_unreadable_folder_keeps_its_rows(app, tmp_path, monkeypatch):
+    data_path = tmp_path / 'data'
+    thumbs = ThumbnailStore(tmp_path / 'thumbs')
+    album = data_path / 'musique' / 'Artiste' / 'Album'
+    _write(album / 'piste.mp3')
+    _write(data_path / 'musique' / 'Autre' / 'piste.mp3')
+    sync_library(str(data_path), thumbs)
+    os.remove(data_path / 'musique' / 'Autre' / 'piste.mp3')
+
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        if str(path) == str(album):
+            raise PermissionError(13, 'Permission denied', str(path))
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', failing_scandir)
+    stats = sync_library(str(data_path), thumbs)
+
+    rows = _check_tree(data_path)
+    assert str(album / 'piste.mp3') in rows
+    assert str(data_path / 'musique' / 'Autre' / 'piste.mp3') not in rows
+    assert stats['removed'] == 1
+
+
+def test_sync_paths_removed_tree_counted_once(app, tmp_path):
+    data_path = tmp_path / 'data'
+    thumbs = ThumbnailStore(tmp_path / 'thumbs')
+    album = data_path / 'musique' / 'Artiste' / 'Album'
+    tracks = [_write(album / 'piste1.mp3'), _write(album / 'piste2.mp3')]
+    sync_library(str(data_path), thumbs)
+
+    for track in tracks:
+        track.unlink()
+    album.rmdir()
+    stats = sync_paths(str(data_path), [album, *tracks], thumbs)
+
+    assert stats['removed'] == 3
+    assert str(album) not in _check_tree(data_path)
@@ -0,0 +1,40 @@
+import base64
+
+from sqlalchemy import inspect, text
+
+from karapp.migrations import MIGRATIONS, get_version, set_version, upgrade_db
+from karapp.models import db
+from karapp.tools.thumbnails import ThumbnailStore
+
+# en-tête JPEG suffisant pour être conservé tel quel par la conversion
+JPEG = b'\xff\xd8\xff\xe0' + b'0' * 32
+
+
+def _old_artwork_db():
+    """Base à la version précédant la conversion, avec une miniature base64"""
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('ALTER TABLE files ADD COLUMN artwork TEXT')
+        conn.exec_driver_sql(
+            "INSERT INTO files (type, category, path, name, artwork) VALUES ('file', 'music', '/m/a.mp3', 'a', ?)",
+            (base64.b64encode(JPEG).decode(),))
+        set_version(conn, len(MIGRATIONS) - 1)
+
+
+def test_artwork_converted_once(app, tmp_path):
+    _old_artwork_db()
+    thumbs = ThumbnailStore(tmp_path / 'thumbs')
+
+    assert upgrade_db(thumbs) == len(MIGRATIONS)
+    with db.engine.connect() as conn:
+        assert get_version(conn) == len(MIGRATIONS)
+        digest = conn.execute(text("SELECT artwork_hash FROM files WHERE path = '/m/a.mp3'")).scalar()
+        columns = {c['name'] for c in inspect(conn).get_columns('files')}
+    assert digest is not None
+    assert thumbs.path_for(digest).read_bytes() == JPEG
+    # selon la version de SQLite la colonne est supprimée ou vidée
+    if 'artwork' in columns:
+        with db.engine.connect() as conn:
+            assert conn.execute(text('SELECT COUNT(*) FROM files WHERE artwork IS NOT NULL')).scalar() == 0
+
+    # un second démarrage ne refait pas la conversion
+    assert upgrade_db() == len(MIGRATIONS)
@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip('requests')
+
+from karapp.tools.rss.mpdsearch import FeedUrlCache
+
+
+def test_stale_feeds_are_missing(tmp_path, monkeypatch):
+    cache = FeedUrlCache(str(tmp_path / 'rss_cache.db'), ttl=100)
+    monkeypatch.setattr('time.time', lambda: 1000.0)
+    cache.put_many({'https://apple/a': 'https://feed/a'})
+    assert cache.get_many(['https://apple/a']) == {'https://apple/a': 'https://feed/a'}
+
+    monkeypatch.setattr('time.time', lambda: 1101.0)
+    assert cache.get_many(['https://apple/a']) == {}
+
+    # une nouvelle résolution rafraîchit l'entrée
+    cache.put_many({'https://apple/a': 'https://feed/b'})
+    assert cache.get_many(['https://apple/a']) == {'https://apple/a': 'https://feed/b'}
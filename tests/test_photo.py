@@ -0,0 +1,47 @@
+import pytest
+
+requests = pytest.importorskip('requests')
+
+from karapp.tools import photo
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b''):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}')
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Réponses par url de requests.get"""
+    responses = {}
+
+    def get(url, headers=None, timeout=None):
+        response = responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(requests, 'get', get)
+    monkeypatch.setattr(photo, '_image_cache', type(photo._image_cache)())
+    monkeypatch.setattr(photo, '_image_cache_size', 0)
+    monkeypatch.setattr(photo, '_url_locks', {})
+    return responses
+
+
+def test_failed_fetches_leave_no_lock(server):
+    server['https://example.org/404.jpg'] = FakeResponse(404)
+    server['https://example.org/lent.jpg'] = requests.Timeout('délai dépassé')
+    server['https://example.org/ok.jpg'] = FakeResponse(200, b'image')
+
+    for url in ('https://example.org/404.jpg', 'https://example.org/lent.jpg'):
+        with pytest.raises(requests.RequestException):
+            photo.fetch_image(url)
+    assert photo.fetch_image('https://example.org/ok.jpg') == b'image'
+
+    assert list(photo._url_locks) == ['https://example.org/ok.jpg']
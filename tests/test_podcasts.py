@@ -0,0 +1,46 @@
+"""Repérage des nouveaux épisodes d'un podcast"""
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from karapp import podcasts
+from karapp.models import db, FileModel
+
+
+def _episodes(*guids):
+    return [{'titre': f'Épisode {guid}', 'guid': guid} for guid in guids]
+
+
+@pytest.fixture
+def podcast(app):
+    model = FileModel(type='dir', category='podcast', path='/data/podcast/p', name='p',
+                      url='http://example.com/feed')
+    db.session.add(model)
+    db.session.commit()
+    return model
+
+
+def test_episodes_seen_once_are_not_reported_again(podcast, monkeypatch):
+    refresher = podcasts.PodcastRefresher(None, submit=lambda titles, url: None)
+    feed = _episodes('e3', 'e2', 'e1')
+    monkeypatch.setattr(podcasts.rss, 'get_episodes_list', lambda url: feed)
+    # un seul ancien épisode téléchargé
+    db.session.add(FileModel(type='file', category='podcast', path='/data/podcast/p/e1.mp3',
+                             name='Épisode e1', guid='e1', parent=podcast.id))
+    podcast.last_seen_guid = 'e1'
+    db.session.commit()
+
+    new, newest = podcasts.find_new_episodes(podcast)
+    assert [e['guid'] for e in new] == ['e3', 'e2']
+
+    refresher.refresh(podcast.id)
+    assert podcast.last_seen_guid == 'e3'
+    assert podcasts.find_new_episodes(podcast) == ([], 'e3')
+
+    feed.insert(0, {'titre': 'Épisode e4', 'guid': 'e4'})
+    assert [e['guid'] for e in podcasts.find_new_episodes(podcast)[0]] == ['e4']
+
+
+def test_podcast_without_mark_reports_nothing(podcast, monkeypatch):
+    monkeypatch.setattr(podcasts.rss, 'get_episodes_list', lambda url: _episodes('e2', 'e1'))
+    assert podcasts.find_new_episodes(podcast) == ([], 'e2')
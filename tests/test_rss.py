@@ -0,0 +1,70 @@
+import pytest
+
+feedparser = pytest.importorskip('feedparser')
+
+from karapp.tools import rss
+
+URL = 'https://example.org/feed.xml'
+
+
+RSS = """<?xml version="1.0"?>
+<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd"><channel>
+<title>Podcast</title>
+<item><title>Episode 1</title><guid>ep-1</guid><description>Premier</description><itunes:image href="https://example.org/ep1.jpg"/>
+<enclosure url="https://example.org/ep1.mp3" type="audio/mpeg" length="1"/></item>
+</channel></rss>"""
+_parse = feedparser.parse
+
+
+def _feed(status, document=RSS):
+    """Résultat de feedparser pour une réponse HTTP"""
+    feed = _parse(document)
+    feed['status'] = status
+    feed['etag'] = '"v1"'
+    return feed
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """Réponses successives de feedparser.parse, et arguments reçus"""
+    queue = []
+    calls = []
+
+    def parse(url, **kwargs):
+        calls.append(kwargs)
+        return queue.pop(0)
+
+    monkeypatch.setattr(feedparser, 'parse', parse)
+    # chaque appel revalide le flux
+    monkeypatch.setattr(rss, 'FEED_TTL', 0)
+    monkeypatch.setattr(rss, '_feed_cache', type(rss._feed_cache)())
+    return queue, calls
+
+
+def test_not_modified_reuses_cached_feed(responses):
+    queue, calls = responses
+    queue += [_feed(200), _feed(304, '')]
+
+    assert rss.get_infos(URL)['titre'] == 'Podcast'
+    assert [e['guid'] for e in rss.get_episodes_list(URL)] == ['ep-1']
+    assert calls[1]['etag'] == '"v1"'
+
+
+def test_http_error_keeps_cached_feed(responses):
+    queue, _ = responses
+    queue += [_feed(200), _feed(503, ''), _feed(200, '<rss><channel'), _feed(304, '')]
+
+    rss.get_feed(URL)
+    assert rss.get_infos(URL)['titre'] == 'Podcast'
+    assert [e['guid'] for e in rss.get_episodes_list(URL)] == ['ep-1']
+    # le flux en cache n'a pas été remplacé : la revalidation suivante le réutilise
+    assert rss.get_infos(URL)['titre'] == 'Podcast'
+
+
+def test_error_without_cache_is_not_stored(responses):
+    queue, calls = responses
+    queue += [_feed(404, ''), _feed(200)]
+
+    assert rss.get_episodes_list(URL) == []
+    assert rss.get_infos(URL)['titre'] == 'Podcast'
+    assert calls[1] == {}